@@ -0,0 +1,180 @@
+# bin_request_dedup.py
+
+import random
+import re
+import zlib
+from typing import Dict, List
+
+NUM_PERM          = 64      # MinHash signature length
+NUM_BANDS         = 16      # LSH bands (NUM_PERM / NUM_BANDS rows per band)
+SHINGLE_SIZE      = 3       # word shingles
+DUPLICATE_JACCARD = 0.8     # estimated similarity above which bodies collapse
+MIN_SHINGLES      = 5       # shorter bodies are never treated as duplicates
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH       = (1 << 32) - 1
+
+# seeded (a, b) pairs so signatures are stable across reruns / processes
+_rng          = random.Random(2508)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def normalize_body(body: str) -> str:
+    """
+    Drop quoted reply lines ("> ...") and forwarded headers, lowercase
+    and collapse whitespace so replies and forwards shingle like the
+    original message.
+    """
+    lines = []
+    for line in (body or "").splitlines():
+        stripped = line.strip()
+        if stripped.startswith(">"):
+            continue
+        if re.match(r"^(-+ ?forwarded message ?-+|(fwd?|re):|from:|sent:|to:|subject:)",
+                    stripped, flags=re.IGNORECASE):
+            continue
+        lines.append(stripped)
+    text = " ".join(lines).lower()
+    text = re.sub(r"[^\w³]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    words = text.split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set: set) -> List[int]:
+    """
+    MinHash signature of a shingle set: one crc32 per shingle, then
+    NUM_PERM universal-hash permutations of it.
+    """
+    if not shingle_set:
+        return [_MAX_HASH] * NUM_PERM
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def numeric_tokens(text: str) -> frozenset:
+    """
+    Tokens containing a digit (dates, quantities, civic numbers) of a
+    normalized body. A forward or resend keeps them; a repeat order for
+    another date or quantity does not.
+    """
+    return frozenset(t for t in text.split() if any(c.isdigit() for c in t))
+
+
+def estimated_jaccard(sig1: List[int], sig2: List[int]) -> float:
+    return sum(x == y for x, y in zip(sig1, sig2)) / NUM_PERM
+
+
+def group_messages(messages: List[Dict]) -> List[Dict]:
+    """
+    Collapse unread messages into logical bin requests.
+
+    Each message is a dict with message_id, thread_id, from_address, body
+    and sent_at. Messages sharing a thread_id are grouped, then messages
+    from the same sender whose bodies are near-duplicates (MinHash/LSH
+    over word shingles) and carry the same numeric tokens (dates,
+    quantities, civic numbers) are merged. Bodies with fewer than MIN_SHINGLES
+    shingles, or without a sender, only group by thread. Returns
+    one dict per logical request, ordered by first sent_at:
+      - message_id   (the latest message, used as the representative)
+      - thread_id
+      - raw_body     (body of the representative)
+      - context      (earlier distinct bodies of the group, oldest first)
+      - message_ids  (every message collapsed into this request)
+    """
+    parent = list(range(len(messages)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    # 1) same thread → same request
+    by_thread: Dict[str, int] = {}
+    for i, msg in enumerate(messages):
+        tid = msg.get("thread_id")
+        if not tid:
+            continue
+        if tid in by_thread:
+            union(by_thread[tid], i)
+        else:
+            by_thread[tid] = i
+
+    # 2) near-duplicate bodies from the same sender with the same dates,
+    #    quantities and numbers → same request (LSH candidates, then verify)
+    rows       = NUM_PERM // NUM_BANDS
+    signatures = {}
+    for i, msg in enumerate(messages):
+        sender = (msg.get("from_address") or "").strip().lower()
+        text   = normalize_body(msg.get("body"))
+        sh     = shingles(text)
+        if sender and len(sh) >= MIN_SHINGLES:
+            signatures[i] = ((sender, numeric_tokens(text)), minhash(sh))
+    buckets: Dict[tuple, int] = {}
+    for i, (owner, sig) in signatures.items():
+        for band in range(NUM_BANDS):
+            key = (owner, band, tuple(sig[band * rows:(band + 1) * rows]))
+            j = buckets.setdefault(key, i)
+            if j != i and find(i) != find(j):
+                if estimated_jaccard(sig, signatures[j][1]) >= DUPLICATE_JACCARD:
+                    union(i, j)
+
+    # 3) emit one logical request per component
+    components: Dict[int, List[int]] = {}
+    for i in range(len(messages)):
+        components.setdefault(find(i), []).append(i)
+
+    groups = []
+    for members in components.values():
+        members.sort(key=lambda i: (str(messages[i].get("sent_at") or ""), i))
+        latest = messages[members[-1]]
+
+        context, seen = [], {normalize_body(latest.get("body"))}
+        for i in members[:-1]:
+            body = messages[i].get("body") or ""
+            key  = normalize_body(body)
+            if key not in seen:
+                seen.add(key)
+                context.append(body)
+
+        groups.append((str(messages[members[0]].get("sent_at") or ""), {
+            "message_id":  latest.get("message_id"),
+            "thread_id":   latest.get("thread_id"),
+            "raw_body":    latest.get("body") or "",
+            "context":     context,
+            "message_ids": [messages[i].get("message_id") for i in members],
+        }))
+
+    groups.sort(key=lambda g: g[0])
+    return [g for _, g in groups]
+
+
+def thread_prompt(group: Dict) -> str:
+    """
+    User-turn content for the extraction completion: the latest message,
+    preceded by earlier messages of the thread when there are any.
+    """
+    if not group["context"]:
+        return group["raw_body"]
+    history = "\n\n---\n\n".join(group["context"])
+    return (
+        f"Earlier messages in this thread (oldest first):\n{history}\n\n"
+        f"Latest message:\n{group['raw_body']}"
+    )
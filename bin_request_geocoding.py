@@ -0,0 +1,181 @@
+# bin_request_geocoding.py
+#
+# Background batch job: pull the delivery address out of every bin
+# request email that has no location yet, geocode the distinct addresses
+# with bounded concurrency, and append the results to
+# bin_request_locations. The review tab and route planning then read
+# coordinates from that table instead of calling HERE on the interactive
+# path.
+#
+# Deployed as the geocode_bin_requests stored procedure (see setup.sql).
+# The procedure runs in its own process, so it gets its own here_geocode
+# bucket (rate_limiter.BUDGETS) rather than sharing the app's: the two
+# rates together must fit the HERE plan. Imports here_api only, so the
+# procedure does not need streamlit.
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from snowflake.snowpark.types import (
+    DoubleType, StringType, StructField, StructType, TimestampType,
+)
+
+from here_api import call_geocoding_here_api
+from rate_limiter import BACKGROUND
+
+LOCATIONS_TABLE = "bin_request_locations"
+BATCH_SIZE      = 500
+MAX_WORKERS     = 4
+
+LOCATIONS_SCHEMA = StructType([
+    StructField("MESSAGE_ID",  StringType()),
+    StructField("ADDRESS",     StringType()),
+    StructField("ADDRESS_KEY", StringType()),
+    StructField("LAT",         DoubleType()),
+    StructField("LON",         DoubleType()),
+    StructField("STATUS",      StringType()),
+    StructField("GEOCODED_AT", TimestampType()),
+])
+
+# US ZIP (12345, 12345-6789) or Canadian postal code (H2X 1Y4)
+_POSTAL = r"(?:\d{5}(?:-\d{4})?|[A-Z]\d[A-Z]\s?\d[A-Z]\d)"
+# "at <number> <street>, <city>, <ST/province>[ <postal>]", or without
+# commas when a postal code closes the address. Anything else (no civic
+# number, no state/province code) is not recognized: no other step
+# extracts delivery addresses, so those emails get a permanent
+# "no_address" row and are not retried.
+# street and city words are capitalized or numeric ("Oak", "7th",
+# "Rue"), with a few lowercase particles ("Rue de la Montagne"), so a
+# match cannot start at an earlier number in the sentence ("2 bins to
+# 123 Oak St, ...")
+_WORD  = r"(?:[A-ZÀ-Þ0-9][\w.'-]*|de|du|des|la|le|of)"
+_WORDS = _WORD + r"(?:\s+" + _WORD + r")*?"
+_ADDRESS = (
+    r"\d+\s+(?:"
+    + _WORDS + r",\s*" + _WORDS + r",\s*[A-Z]{2}(?:\s+" + _POSTAL + r")?"
+    r"|" + _WORDS + r"\s+[A-Z]{2}\s+" + _POSTAL +
+    r")"
+)
+_ADDRESS_RE     = re.compile(r"\bat\s+(" + _ADDRESS + r")\b")
+_ANY_ADDRESS_RE = re.compile(r"\b(" + _ADDRESS + r")\b")
+
+
+def address_key(address: str) -> str:
+    """Normalized form used to match addresses across emails and queries."""
+    return " ".join((address or "").lower().split()).strip(" ,.")
+
+
+def extract_delivery_address(body: str) -> Optional[str]:
+    """
+    Delivery address from a request body ("... for 7 days at 123 Oak St,
+    Fresno, CA" or "at 456 Rue Example Montréal QC H2X 1Y4"), or None for
+    vague requests ("at my usual location").
+    """
+    m = _ADDRESS_RE.search(body or "")
+    return m.group(1).strip() if m else None
+
+
+def find_addresses(text: str) -> List[str]:
+    """Every street address written out in full in text, in order (no LLM call)."""
+    return [m.group(1).strip() for m in _ANY_ADDRESS_RE.finditer(text or "")]
+
+
+def _geocode(address: str) -> Tuple[Optional[float], Optional[float], str]:
+    try:
+        items = call_geocoding_here_api(address, BACKGROUND).get("items") or []
+    except Exception:
+        return None, None, "error"
+    if not items:
+        return None, None, "not_found"
+    pos = items[0]["position"]
+    return pos["lat"], pos["lng"], "ok"
+
+
+def pending_messages(session, limit: int = BATCH_SIZE) -> List[Dict]:
+    pdf = session.sql(f"""
+        SELECT e.message_id, e.body
+        FROM emails_webinar_202508 e
+        LEFT JOIN {LOCATIONS_TABLE} l ON l.message_id = e.message_id
+        WHERE l.message_id IS NULL
+        ORDER BY e.received_at
+        LIMIT {int(limit)}
+    """).to_pandas()
+    return [{"message_id": r.MESSAGE_ID, "body": r.BODY} for r in pdf.itertuples(index=False)]
+
+
+def lookup_coordinates(session, addresses: List[str]) -> Dict[str, Tuple[float, float]]:
+    """Precomputed coordinates keyed by address_key, for addresses already geocoded."""
+    keys = sorted({address_key(a) for a in addresses if a})
+    if not keys:
+        return {}
+    in_list = ", ".join("'" + k.replace("'", "''") + "'" for k in keys)
+    rows = session.sql(f"""
+        SELECT address_key, ANY_VALUE(lat) AS lat, ANY_VALUE(lon) AS lon
+        FROM {LOCATIONS_TABLE}
+        WHERE status = 'ok' AND address_key IN ({in_list})
+        GROUP BY address_key
+    """).collect()
+    return {r["ADDRESS_KEY"]: (r["LAT"], r["LON"]) for r in rows}
+
+
+def locations_for_messages(session, message_ids: List[str]) -> Dict[str, Dict]:
+    """Stored location rows (address, lat, lon, status) keyed by message_id."""
+    if not message_ids:
+        return {}
+    in_list = ", ".join("'" + str(m).replace("'", "''") + "'" for m in message_ids)
+    rows = session.sql(f"""
+        SELECT message_id, address, lat, lon, status
+        FROM {LOCATIONS_TABLE}
+        WHERE message_id IN ({in_list})
+    """).collect()
+    return {
+        r["MESSAGE_ID"]: {
+            "address": r["ADDRESS"], "lat": r["LAT"], "lon": r["LON"], "status": r["STATUS"],
+        }
+        for r in rows
+    }
+
+
+def run_batch(session, limit: int = BATCH_SIZE) -> Dict[str, int]:
+    """Geocode up to `limit` emails without a location; returns status counts."""
+    messages = pending_messages(session, limit)
+    if not messages:
+        return {}
+
+    addresses = {m["message_id"]: extract_delivery_address(m["body"]) for m in messages}
+    known     = lookup_coordinates(session, list(addresses.values()))
+    todo      = sorted({address_key(a): a for a in addresses.values()
+                        if a and address_key(a) not in known}.items())
+
+    geocoded: Dict[str, Tuple[Optional[float], Optional[float], str]] = {
+        k: (lat, lon, "ok") for k, (lat, lon) in known.items()
+    }
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for (key, _), result in zip(todo, pool.map(_geocode, [a for _, a in todo])):
+            geocoded[key] = result
+
+    now    = datetime.utcnow()
+    rows   = []
+    counts: Dict[str, int] = {}
+    for mid, addr in addresses.items():
+        if addr is None:
+            lat, lon, status = None, None, "no_address"
+        else:
+            lat, lon, status = geocoded[address_key(addr)]
+        counts[status] = counts.get(status, 0) + 1
+        # failed calls get no row, so the next batch retries them
+        if status != "error":
+            key = address_key(addr) if addr else None
+            rows.append([mid, addr, key, lat, lon, status, now])
+
+    if rows:
+        session.create_dataframe(rows, schema=LOCATIONS_SCHEMA) \
+            .write.mode("append").save_as_table(LOCATIONS_TABLE)
+    return counts
+
+
+def main(session, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Stored procedure handler."""
+    return run_batch(session, batch_size)
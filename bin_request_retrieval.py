@@ -2,44 +2,92 @@
 
 import json
 from snowflake.snowpark.context import get_active_session
+from bin_request_dedup import group_messages, thread_prompt
+from rate_limiter import run
+from bin_request_geocoding import locations_for_messages
 
 session = get_active_session()
 
+MAX_REQUESTS  = 5      # logical requests (after grouping) sent to COMPLETE
+UNREAD_WINDOW = 200    # unread messages considered for grouping
+
+
+def fetch_unread_messages(limit: int = UNREAD_WINDOW) -> list[dict]:
+    UNREAD_SQL = f"""
+    SELECT message_id, thread_id, from_address, body, sent_at
+    FROM emails_webinar_202508
+    WHERE is_read = FALSE
+    ORDER BY sent_at
+    LIMIT {int(limit)}
+    """
+    pdf = session.sql(UNREAD_SQL).to_pandas()
+    return [
+        {
+            "message_id": row.MESSAGE_ID,
+            "thread_id":  row.THREAD_ID,
+            "from_address": row.FROM_ADDRESS,
+            "body":       row.BODY or "",
+            "sent_at":    row.SENT_AT,
+        }
+        for row in pdf.itertuples(index=False)
+    ]
+
+
 def fetch_bin_requests() -> list[dict]:
     """
-    Fetch unread emails, call Cortex.COMPLETE, unwrap the envelope
+    Fetch unread emails, collapse reply chains and near-duplicate bodies
+    into logical requests (see bin_request_dedup), call Cortex.COMPLETE
+    once per logical request with its thread context, unwrap the envelope
     under choices[0].messages, and return:
-      - message_id
+      - message_id  (latest message of the group)
+      - message_ids (every message the request covers)
+      - thread_id
       - raw_body
       - json_output (the *inner* JSON string)
       - container_format, quantity, date_needed, requester
+      - delivery_address, lat, lon (precomputed by the geocoding job,
+        None until it has processed the request)
     """
+    groups = group_messages(fetch_unread_messages())[:MAX_REQUESTS]
+    if not groups:
+        return []
+
+    session.create_dataframe(
+        [[g["message_id"], thread_prompt(g)] for g in groups],
+        schema=["MESSAGE_ID", "PROMPT"],
+    ).create_or_replace_temp_view("bin_request_prompts")
+
     REQUEST_SQL = """
     SELECT
       message_id,
-      body AS raw_body,
       SNOWFLAKE.CORTEX.COMPLETE(
         'claude-4-sonnet',
         [
           {'role':'system',
            'content': $$Extract a JSON object with exactly these keys:
              "container_format","quantity","date_needed","requester".
+             The user turn may include earlier messages of the same thread;
+             the latest message takes precedence.
              Output only the JSON object (no markdown).$$},
-          {'role':'user', 'content': body}
+          {'role':'user', 'content': prompt}
         ],
         {}
       ) AS full_response
-    FROM emails_webinar_202508
-    WHERE is_read = FALSE
-    LIMIT 5
+    FROM bin_request_prompts
     """
-    df  = session.sql(REQUEST_SQL)
-    pdf = df.to_pandas()
+    # warehouse COMPLETE has its own budget, separate from the agent endpoint
+    pdf = run("cortex_complete", lambda: session.sql(REQUEST_SQL).to_pandas())
+
+    responses = {row.MESSAGE_ID: row.FULL_RESPONSE for row in pdf.itertuples(index=False)}
+
+    locations = locations_for_messages(
+        session, [mid for g in groups for mid in g["message_ids"]]
+    )
 
     results = []
-    for row in pdf.itertuples(index=False):
-        raw     = row.RAW_BODY or ""
-        outer_j = row.FULL_RESPONSE or "{}"
+    for group in groups:
+        raw     = group["raw_body"]
+        outer_j = responses.get(group["message_id"]) or "{}"
 
         # 1) parse the outer envelope
         try:
@@ -66,14 +114,26 @@ def fetch_bin_requests() -> list[dict]:
         dt  = inner.get("date_needed", "")
         req = inner.get("requester", "")
 
+        # any geocoded message of the group will do, latest first
+        loc = next(
+            (locations[m] for m in reversed(group["message_ids"])
+             if locations.get(m, {}).get("status") == "ok"),
+            {},
+        )
+
         results.append({
-            "message_id":       row.MESSAGE_ID,
+            "message_id":       group["message_id"],
+            "message_ids":      group["message_ids"],
+            "thread_id":        group["thread_id"],
             "raw_body":         raw,
             "json_output":      msg_str,    # the *inner* JSON
             "container_format": fmt,
             "quantity":         qty,
             "date_needed":      dt,
             "requester":        req,
+            "delivery_address": loc.get("address"),
+            "lat":              loc.get("lat"),
+            "lon":              loc.get("lon"),
         })
 
     return results
@@ -84,3 +144,15 @@ def mark_request_read(message_id: str) -> None:
       SET is_read = TRUE
       WHERE message_id = '{message_id}'
     """).collect()
+
+
+def mark_requests_read(message_ids: list[str]) -> None:
+    """Mark every message collapsed into one logical request as read."""
+    if not message_ids:
+        return
+    ids = ", ".join("'" + str(mid).replace("'", "''") + "'" for mid in message_ids)
+    session.sql(f"""
+      UPDATE emails_webinar_202508
+      SET is_read = TRUE
+      WHERE message_id IN ({ids})
+    """).collect()
@@ -1,30 +1,17 @@
 # call_here_api.py
 import streamlit as st
-import os
-import _snowflake
 import requests
 #import flexpolyline
 from typing import Tuple, Dict, List, Union
+from single_flight import flight, request_key
+from rate_limiter import run
+# geocoding and matrix calls live in the UI-free here_api module
+from here_api import (  # noqa: F401  (re-exported for the app)
+    _raise_for_status, call_geocoding_here_api, call_matrix_here_api, secret,
+)
 
 # import flexpolyline  # pip install flexpolyline
 
-secret = _snowflake.get_generic_secret_string("here_api_key")
-os.environ["HERE_API_KEY"] = secret
-
-
-def call_geocoding_here_api(address: str) -> Dict:
-    params = {
-        "q": address,
-        "apiKey": secret,  # camelCase for Geocoding API
-    }
-    resp = requests.get(
-        "https://geocode.search.hereapi.com/v1/geocode",
-        params=params,
-        timeout=30
-    )
-    resp.raise_for_status()
-    return resp.json()
-
 
 def call_routing_here_api(
     origin: Tuple[float, float],
@@ -43,13 +30,18 @@ def call_routing_here_api(
         "apikey":        secret,
     }
     st.write(f"🔍 Debug — Dans call_routing_here_api: {params}")
-    resp = requests.get(
-        "https://router.hereapi.com/v8/routes",
-        params=params,
-        timeout=30
-    )
-    resp.raise_for_status()
-    return resp.json(), params
+
+    def _get() -> Dict:
+        resp = requests.get(
+            "https://router.hereapi.com/v8/routes",
+            params=params,
+            timeout=30
+        )
+        _raise_for_status(resp)
+        return resp.json()
+
+    key = request_key([round(c, 6) for c in (*origin, *destination)])
+    return flight("here_routing").do(key, lambda: run("here_routing", _get)), params
 
 
 def call_routing_here_api_v7(
@@ -68,9 +60,13 @@ def call_routing_here_api_v7(
         "representation": "display",  # ← returns 'shape' instead of polyline
         "legAttributes": "shape"  # ← include the raw coordinate list
     }
-    resp = requests.get(url, params=params, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+
+    def _get() -> Dict:
+        resp = requests.get(url, params=params, timeout=30)
+        _raise_for_status(resp)
+        return resp.json()
+
+    return run("here_routing", _get)
 
 def decode_shape(response: dict) -> list[tuple[float, float]]:
     """
@@ -108,25 +104,7 @@ def decode_polyline(data: Union[str, Dict]) -> List[Tuple[float, float]]:
 
 
 def display_map(coords: List[Tuple[float, float]]):
-    import pandas as pd
-#    import pydeck as pdk
-    import streamlit as st
-
-    if not coords:
-        st.write("No coordinates to display.")
-        return
-
-    df = pd.DataFrame(coords, columns=["lat", "lon"])
-    layer = pdk.Layer(
-        "PathLayer",
-        data=df,
-        get_path="[[lon, lat] for lon, lat in zip(df['lon'], df['lat'])]",
-        get_width=5,
-        pickable=False
-    )
-    view_state = pdk.ViewState(
-        latitude=df["lat"].mean(),
-        longitude=df["lon"].mean(),
-        zoom=10
-    )
-    st.pydeck_chart(pdk.Deck(layers=[layer], initial_view_state=view_state))
+    """Single route; see map_rendering for many routes and stops."""
+    from map_rendering import display_routes
+
+    display_routes([coords] if coords else [], stops=coords[:1] + coords[-1:])
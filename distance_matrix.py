@@ -0,0 +1,296 @@
+# distance_matrix.py
+#
+# Precomputed depot × customer distance/duration table. A scheduled job
+# (refresh_matrix, deployed as the refresh_depot_matrix procedure in
+# setup.sql) pairs every depot with the most frequent geocoded delivery
+# addresses from bin_request_locations, asks the HERE Matrix API for road
+# distances and travel times (falling back to a haversine × road-factor
+# estimate), and replaces the rows of depot_customer_matrix. The app
+# loads that table once into a DistanceMatrix: "how far is X from the
+# depot" is a dict lookup plus an array read, and multi-stop ordering
+# runs on NumPy arrays, with no network call.
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from snowflake.snowpark.types import (
+    DoubleType, StringType, StructField, StructType, TimestampTimeZone, TimestampType,
+)
+
+from bin_request_geocoding import LOCATIONS_TABLE, address_key
+
+MATRIX_TABLE    = "depot_customer_matrix"
+DEPOTS_TABLE    = "depots"
+MAX_CUSTOMERS   = 500
+DEST_CHUNK      = 100       # destinations per HERE Matrix request
+ROAD_FACTOR     = 1.3       # road distance / great-circle distance
+AVG_SPEED_MPS   = 13.9      # ~50 km/h urban average
+MATCH_RADIUS_M  = 75.0      # a geocoded point this close is the same customer
+EARTH_RADIUS_M  = 6_371_000.0
+
+# matches the depot_customer_matrix DDL in setup.sql
+MATRIX_SCHEMA = StructType([
+    StructField("DEPOT_ID",    StringType(50)),
+    StructField("ADDRESS_KEY", StringType(1000)),
+    StructField("LAT",         DoubleType()),
+    StructField("LON",         DoubleType()),
+    StructField("DISTANCE_M",  DoubleType()),
+    StructField("DURATION_S",  DoubleType()),
+    StructField("SOURCE",      StringType(10)),
+    StructField("COMPUTED_AT", TimestampType(TimestampTimeZone.NTZ)),
+])
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in metres; broadcasts over arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64))
+                              for x in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def approximate(lat1, lon1, lat2, lon2) -> Tuple[np.ndarray, np.ndarray]:
+    """Offline (distance_m, duration_s) estimate from straight-line distance."""
+    dist = haversine_m(lat1, lon1, lat2, lon2) * ROAD_FACTOR
+    return dist, dist / AVG_SPEED_MPS
+
+
+class DistanceMatrix:
+    def __init__(self, depots: List[Dict], customers: List[Dict],
+                 distance_m: np.ndarray, duration_s: np.ndarray):
+        self.depot_ids    = [d["depot_id"] for d in depots]
+        self.depot_names  = {d["depot_id"]: d.get("name") or d["depot_id"] for d in depots}
+        self.depot_index  = {d: i for i, d in enumerate(self.depot_ids)}
+        self.depot_coords = np.array([[d["lat"], d["lon"]] for d in depots], dtype=np.float64).reshape(-1, 2)
+        self.customer_keys  = [c["address_key"] for c in customers]
+        self.customer_index = {k: j for j, k in enumerate(self.customer_keys)}
+        self.customer_coords = np.array([[c["lat"], c["lon"]] for c in customers], dtype=np.float64).reshape(-1, 2)
+        self.distance_m = np.asarray(distance_m, dtype=np.float32).reshape(len(depots), len(customers))
+        self.duration_s = np.asarray(duration_s, dtype=np.float32).reshape(len(depots), len(customers))
+
+    # ── loading ────────────────────────────────────────────────────────
+    @classmethod
+    def load(cls, session) -> "DistanceMatrix":
+        depots = [
+            {"depot_id": r["DEPOT_ID"], "name": r["NAME"], "lat": r["LAT"], "lon": r["LON"]}
+            for r in session.sql(f"SELECT depot_id, name, lat, lon FROM {DEPOTS_TABLE} ORDER BY depot_id").collect()
+        ]
+        pdf = session.sql(f"""
+            SELECT depot_id, address_key, lat, lon, distance_m, duration_s
+            FROM {MATRIX_TABLE}
+        """).to_pandas()
+        customers_df = pdf.drop_duplicates("ADDRESS_KEY").sort_values("ADDRESS_KEY")
+        customers = [
+            {"address_key": r.ADDRESS_KEY, "lat": r.LAT, "lon": r.LON}
+            for r in customers_df.itertuples(index=False)
+        ]
+        di = {d["depot_id"]: i for i, d in enumerate(depots)}
+        ci = {c["address_key"]: j for j, c in enumerate(customers)}
+        shape = (len(depots), len(customers))
+        distance = np.full(shape, np.nan, dtype=np.float32)
+        duration = np.full(shape, np.nan, dtype=np.float32)
+        rows = pdf[pdf["DEPOT_ID"].isin(di.keys())]
+        if len(rows):
+            r_idx = rows["DEPOT_ID"].map(di).to_numpy().astype(np.int64)
+            c_idx = rows["ADDRESS_KEY"].map(ci).to_numpy().astype(np.int64)
+            distance[r_idx, c_idx] = rows["DISTANCE_M"].to_numpy()
+            duration[r_idx, c_idx] = rows["DURATION_S"].to_numpy()
+        return cls(depots, customers, distance, duration)
+
+    # ── lookups ────────────────────────────────────────────────────────
+    def customer_for(self, address: Optional[str] = None,
+                     lat: Optional[float] = None, lon: Optional[float] = None) -> Optional[int]:
+        """Column of a known customer, by address or by a point within MATCH_RADIUS_M."""
+        if address is not None:
+            j = self.customer_index.get(address_key(address))
+            if j is not None:
+                return j
+        if lat is None or not len(self.customer_coords):
+            return None
+        d = haversine_m(lat, lon, self.customer_coords[:, 0], self.customer_coords[:, 1])
+        j = int(np.argmin(d))
+        return j if d[j] <= MATCH_RADIUS_M else None
+
+    def from_depot(self, depot_id: str, address: Optional[str] = None,
+                   lat: Optional[float] = None, lon: Optional[float] = None
+                   ) -> Optional[Tuple[float, float, str]]:
+        """
+        (distance_m, duration_s, source) from a depot: the precomputed cell
+        when the customer is known, otherwise an estimate from coordinates.
+        """
+        i = self.depot_index.get(depot_id)
+        if i is None:
+            return None
+        j = self.customer_for(address, lat, lon)
+        if j is not None and not np.isnan(self.distance_m[i, j]):
+            return float(self.distance_m[i, j]), float(self.duration_s[i, j]), "matrix"
+        if lat is None:
+            return None
+        dist, dur = approximate(*self.depot_coords[i], lat, lon)
+        return float(dist), float(dur), "estimate"
+
+    def nearest_depot(self, address: Optional[str] = None,
+                      lat: Optional[float] = None, lon: Optional[float] = None
+                      ) -> Optional[Tuple[str, float, float, str]]:
+        """(depot_id, distance_m, duration_s, source) with the shortest travel time."""
+        if not self.depot_ids:
+            return None
+        j = self.customer_for(address, lat, lon)
+        if j is not None and not np.all(np.isnan(self.duration_s[:, j])):
+            i = int(np.nanargmin(self.duration_s[:, j]))
+            return self.depot_ids[i], float(self.distance_m[i, j]), float(self.duration_s[i, j]), "matrix"
+        if lat is None:
+            return None
+        dist, dur = approximate(self.depot_coords[:, 0], self.depot_coords[:, 1], lat, lon)
+        i = int(np.argmin(dur))
+        return self.depot_ids[i], float(dist[i]), float(dur[i]), "estimate"
+
+    def plan_stops(self, depot_id: str, stops: Sequence[Tuple[float, float]]
+                   ) -> Tuple[List[int], float, float]:
+        """
+        Nearest-neighbour visiting order for (lat, lon) stops starting at a
+        depot. The first leg uses the matrix when the stop is a known
+        customer; stop-to-stop legs use the offline estimate. Returns
+        (order as indexes into stops, total distance_m, total duration_s).
+        """
+        i = self.depot_index[depot_id]
+        pts = np.asarray(stops, dtype=np.float64).reshape(-1, 2)
+        if not len(pts):
+            return [], 0.0, 0.0
+        legs_d, legs_t = approximate(pts[:, None, 0], pts[:, None, 1], pts[None, :, 0], pts[None, :, 1])
+        first_d, first_t = approximate(*self.depot_coords[i], pts[:, 0], pts[:, 1])
+        for k, (lat, lon) in enumerate(pts):
+            j = self.customer_for(lat=lat, lon=lon)
+            if j is not None and not np.isnan(self.distance_m[i, j]):
+                first_d[k], first_t[k] = self.distance_m[i, j], self.duration_s[i, j]
+
+        visited = np.zeros(len(pts), dtype=bool)
+        k = int(np.argmin(first_t))
+        order, total_d, total_t = [k], float(first_d[k]), float(first_t[k])
+        visited[k] = True
+        while not visited.all():
+            t = np.where(visited, np.inf, legs_t[k])
+            nxt = int(np.argmin(t))
+            total_d += float(legs_d[k, nxt])
+            total_t += float(legs_t[k, nxt])
+            visited[nxt] = True
+            order.append(nxt)
+            k = nxt
+        return order, total_d, total_t
+
+
+# ── refresh job ─────────────────────────────────────────────────────────
+def frequent_customers(session, limit: int = MAX_CUSTOMERS) -> List[Dict]:
+    rows = session.sql(f"""
+        SELECT address_key, ANY_VALUE(lat) AS lat, ANY_VALUE(lon) AS lon, COUNT(*) AS requests
+        FROM {LOCATIONS_TABLE}
+        WHERE status = 'ok'
+        GROUP BY address_key
+        ORDER BY requests DESC, address_key
+        LIMIT {int(limit)}
+    """).collect()
+    return [{"address_key": r["ADDRESS_KEY"], "lat": r["LAT"], "lon": r["LON"]} for r in rows]
+
+
+def _here_block(depots: List[Dict], customers: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    from here_api import call_matrix_here_api
+    from rate_limiter import BACKGROUND
+
+    resp = call_matrix_here_api(
+        [(d["lat"], d["lon"]) for d in depots],
+        [(c["lat"], c["lon"]) for c in customers],
+        BACKGROUND,
+    )["matrix"]
+    shape = (len(depots), len(customers))
+    dist = np.asarray(resp["distances"], dtype=np.float64).reshape(shape)
+    dur  = np.asarray(resp["travelTimes"], dtype=np.float64).reshape(shape)
+    # HERE reports unroutable pairs through errorCodes
+    failed = np.asarray(resp.get("errorCodes") or np.zeros(dist.size), dtype=np.int64).reshape(shape) != 0
+    dist[failed] = np.nan
+    dur[failed]  = np.nan
+    return dist, dur
+
+
+def refresh_matrix(session, use_here: bool = True) -> Dict[str, int]:
+    """Rebuild depot_customer_matrix; returns row counts per source."""
+    depots = [
+        {"depot_id": r["DEPOT_ID"], "lat": r["LAT"], "lon": r["LON"]}
+        for r in session.sql(f"SELECT depot_id, lat, lon FROM {DEPOTS_TABLE}").collect()
+    ]
+    customers = frequent_customers(session)
+    if not depots or not customers:
+        return {}
+
+    d_lat = np.array([d["lat"] for d in depots])[:, None]
+    d_lon = np.array([d["lon"] for d in depots])[:, None]
+    c_lat = np.array([c["lat"] for c in customers])[None, :]
+    c_lon = np.array([c["lon"] for c in customers])[None, :]
+    est_d, est_t = approximate(d_lat, d_lon, c_lat, c_lon)
+
+    dist = np.full(est_d.shape, np.nan)
+    dur  = np.full(est_d.shape, np.nan)
+    if use_here:
+        for lo in range(0, len(customers), DEST_CHUNK):
+            hi = lo + DEST_CHUNK
+            try:
+                dist[:, lo:hi], dur[:, lo:hi] = _here_block(depots, customers[lo:hi])
+            except Exception:
+                pass    # leave the chunk to the estimate below
+    source = np.where(np.isnan(dist), "approx", "here")
+    dist = np.where(np.isnan(dist), est_d, dist)
+    dur  = np.where(np.isnan(dur), est_t, dur)
+
+    now  = datetime.utcnow()
+    rows = [
+        [d["depot_id"], c["address_key"], c["lat"], c["lon"],
+         float(dist[i, j]), float(dur[i, j]), str(source[i, j]), now]
+        for i, d in enumerate(depots)
+        for j, c in enumerate(customers)
+    ]
+    # truncate keeps the table and its DDL; overwrite would recreate it
+    # with inferred column types
+    session.create_dataframe(rows, schema=MATRIX_SCHEMA) \
+        .write.mode("truncate").save_as_table(MATRIX_TABLE)
+
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row[6]] = counts.get(row[6], 0) + 1
+    return counts
+
+
+def main(session, use_here: bool = True) -> Dict[str, int]:
+    """Stored procedure handler."""
+    return refresh_matrix(session, use_here)
+
+
+if __name__ == "__main__":
+    # lookup latency on a synthetic 5 depots × 2,000 customers matrix
+    import time
+
+    rng = np.random.default_rng(0)
+    depots = [{"depot_id": f"D{i}", "lat": 34 + rng.uniform(-1, 1), "lon": -118 + rng.uniform(-1, 1)}
+              for i in range(5)]
+    customers = [{"address_key": f"{n} main st", "lat": 34 + rng.uniform(-1, 1), "lon": -118 + rng.uniform(-1, 1)}
+                 for n in range(2000)]
+    d_lat = np.array([d["lat"] for d in depots])[:, None]
+    d_lon = np.array([d["lon"] for d in depots])[:, None]
+    dist, dur = approximate(d_lat, d_lon,
+                            np.array([c["lat"] for c in customers])[None, :],
+                            np.array([c["lon"] for c in customers])[None, :])
+    m = DistanceMatrix(depots, customers, dist, dur)
+
+    n = 10_000
+    start = time.perf_counter()
+    for k in range(n):
+        m.from_depot("D0", address=f"{k % 2000} Main St")
+    print(f"from_depot by address: {(time.perf_counter() - start) / n * 1e6:.1f} µs")
+    start = time.perf_counter()
+    for k in range(n):
+        m.nearest_depot(address=f"{k % 2000} Main St")
+    print(f"nearest_depot:         {(time.perf_counter() - start) / n * 1e6:.1f} µs")
+    stops = [(c["lat"], c["lon"]) for c in customers[:25]]
+    start = time.perf_counter()
+    m.plan_stops("D0", stops)
+    print(f"plan_stops (25 stops): {(time.perf_counter() - start) * 1e3:.2f} ms")
@@ -0,0 +1,75 @@
+# here_api.py
+#
+# HERE HTTP helpers with no UI dependencies, so the batch stored
+# procedures (geocode_bin_requests, refresh_depot_matrix) can import them
+# without streamlit. call_here_api.py re-exports them for the app.
+
+import os
+from typing import Dict, List, Tuple
+
+import _snowflake
+import requests
+
+from rate_limiter import INTERACTIVE, RateLimited, retry_after_seconds, run
+from single_flight import flight, request_key
+
+secret = _snowflake.get_generic_secret_string("here_api_key")
+os.environ["HERE_API_KEY"] = secret
+
+
+def _raise_for_status(resp: requests.Response) -> None:
+    if resp.status_code == 429:
+        raise RateLimited(retry_after_seconds(resp.headers))
+    resp.raise_for_status()
+
+
+def call_geocoding_here_api(address: str, priority: int = INTERACTIVE) -> Dict:
+    params = {
+        "q": address,
+        "apiKey": secret,  # camelCase for Geocoding API
+    }
+
+    def _get() -> Dict:
+        resp = requests.get(
+            "https://geocode.search.hereapi.com/v1/geocode",
+            params=params,
+            timeout=30
+        )
+        _raise_for_status(resp)
+        return resp.json()
+
+    # concurrent sessions geocoding the same address share one call,
+    # which then queues for a here_geocode token
+    key = request_key(" ".join(address.lower().split()))
+    return flight("here_geocode").do(key, lambda: run("here_geocode", _get, priority))
+
+
+def call_matrix_here_api(
+    origins: List[Tuple[float, float]],
+    destinations: List[Tuple[float, float]],
+    priority: int = INTERACTIVE,
+) -> Dict:
+    """
+    HERE Matrix Routing v8 (synchronous): travel times (s) and distances
+    (m) for every origin × destination, row-major by origin under
+    response["matrix"].
+    """
+    body = {
+        "origins":          [{"lat": lat, "lng": lon} for lat, lon in origins],
+        "destinations":     [{"lat": lat, "lng": lon} for lat, lon in destinations],
+        "regionDefinition": {"type": "world"},
+        "matrixAttributes": ["travelTimes", "distances"],
+        "transportMode":    "car",
+    }
+
+    def _post() -> Dict:
+        resp = requests.post(
+            "https://matrix.router.hereapi.com/v8/matrix",
+            params={"async": "false", "apiKey": secret},
+            json=body,
+            timeout=60
+        )
+        _raise_for_status(resp)
+        return resp.json()
+
+    return run("here_matrix", _post, priority)
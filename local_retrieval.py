@@ -0,0 +1,323 @@
+# local_retrieval.py
+#
+# Optional local fast path for simple lookup questions over
+# sales_conversations.transcript_text ("what did SecureBank say about
+# pricing?"). Combines a BM25 inverted index with a compact hashed
+# embedding matrix, fused by reciprocal rank. Everything is stored as
+# .npy files and memory-mapped, and new conversations are appended from a
+# conversation_date watermark, so opening the index and answering a
+# top-k citation lookup takes milliseconds.
+
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_DIR      = "/tmp/sales_conversations_index"
+EMBED_DIM      = 256
+BM25_K1        = 1.2
+BM25_B         = 0.75
+RRF_K          = 60
+MAX_AGE_S      = 300        # re-check the watermark at most this often
+SEARCH_SERVICE = "pnp.etremblay.sales_conversation_search"
+
+_STOPWORDS = set("""
+a an and are as at be by did do does for from had has have in is it its of on
+or our said say says that the their them they this to was were what which who
+with about discuss discussed mention mentioned
+""".split())
+
+_AGGREGATE_WORDS = re.compile(
+    r"\b(how many|total|average|avg|sum|count|revenue|trend|compare|ratio|"
+    r"percent|top \d+|by month|per month|win rate)\b",
+    flags=re.IGNORECASE,
+)
+_LOOKUP_WORDS = re.compile(
+    r"^\s*(what|which|who|when|where|did|does)\b.*\b(say|said|says|mention|"
+    r"mentioned|discuss|discussed|ask|asked|about|concern|concerns)\b",
+    flags=re.IGNORECASE,
+)
+
+
+def is_lookup_question(question: str) -> bool:
+    """True for citation-style questions that don't need Analyst or an LLM."""
+    return bool(_LOOKUP_WORDS.search(question)) and not _AGGREGATE_WORDS.search(question)
+
+
+def tokenize(text: str) -> List[str]:
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    return [w for w in words if w not in _STOPWORDS and len(w) > 1]
+
+
+def _bucket(feature: str) -> Tuple[int, float]:
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % EMBED_DIM, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+def embed(tokens: List[str]) -> np.ndarray:
+    """
+    Signed feature-hashing embedding over unigrams and bigrams with
+    sublinear term weights, L2-normalised.
+    """
+    vec = np.zeros(EMBED_DIM, dtype=np.float32)
+    counts: Dict[str, int] = {}
+    for feat in tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]:
+        counts[feat] = counts.get(feat, 0) + 1
+    for feat, n in counts.items():
+        idx, sign = _bucket(feat)
+        vec[idx] += sign * (1.0 + np.log(n))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class LocalRetrievalIndex:
+    """
+    On-disk layout in `path`:
+      meta.json        watermark, doc_ids, customer names, vocab
+      doc_len.npy      float32[N]   tokens per document
+      embeddings.npy   float16[N,D] hashed embeddings
+      term_offsets.npy int64[V+1]   CSR offsets into the postings
+      post_docs.npy    int32[P]     posting document ids
+      post_tf.npy      float32[P]   posting term frequencies
+    """
+
+    def __init__(self, path: str = INDEX_DIR):
+        self.path         = path
+        self.watermark    = None
+        self.doc_ids: List[str]       = []
+        self.customers: List[str]     = []
+        self.vocab: Dict[str, int]    = {}
+        self.doc_len      = np.zeros(0, dtype=np.float32)
+        self.embeddings   = np.zeros((0, EMBED_DIM), dtype=np.float16)
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs    = np.zeros(0, dtype=np.int32)
+        self.post_tf      = np.zeros(0, dtype=np.float32)
+        self.checked_at   = 0.0
+        # one index object is shared by every Streamlit session
+        self._lock        = threading.Lock()
+
+    # ── persistence ────────────────────────────────────────────────────
+    @classmethod
+    def open(cls, path: str = INDEX_DIR) -> "LocalRetrievalIndex":
+        idx = cls(path)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return idx
+        with open(meta_path) as f:
+            meta = json.load(f)
+        idx.watermark = meta["watermark"]
+        idx.doc_ids   = meta["doc_ids"]
+        idx.customers = meta["customers"]
+        idx.vocab     = meta["vocab"]
+        for name in ("doc_len", "embeddings", "term_offsets", "post_docs", "post_tf"):
+            setattr(idx, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        return idx
+
+    def _save(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        for name in ("doc_len", "embeddings", "term_offsets", "post_docs", "post_tf"):
+            tmp = os.path.join(self.path, f"{name}.tmp.npy")
+            np.save(tmp, np.asarray(getattr(self, name)))
+            os.replace(tmp, os.path.join(self.path, f"{name}.npy"))
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "watermark": self.watermark,
+                "doc_ids":   self.doc_ids,
+                "customers": self.customers,
+                "vocab":     self.vocab,
+            }, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    # ── incremental build ──────────────────────────────────────────────
+    def add_documents(self, rows: List[Dict]) -> int:
+        """
+        Append conversations (conversation_id, transcript_text,
+        customer_name, conversation_date). Already-indexed ids are skipped.
+        Returns the number of documents added.
+        """
+        with self._lock:
+            return self._append(rows)
+
+    def _append(self, rows: List[Dict]) -> int:
+        known = set(self.doc_ids)
+        rows  = [r for r in rows if r["conversation_id"] not in known]
+        if not rows:
+            return 0
+
+        base = len(self.doc_ids)
+        new_terms, new_docs, new_tf, new_len, new_emb = [], [], [], [], []
+        for offset, row in enumerate(rows):
+            # customer name is indexed with the transcript so "what did
+            # SecureBank say" matches even when the name is not repeated
+            tokens = tokenize(f"{row.get('customer_name') or ''} {row['transcript_text']}")
+            counts: Dict[str, int] = {}
+            for t in tokens:
+                counts[t] = counts.get(t, 0) + 1
+            for term, n in counts.items():
+                new_terms.append(self.vocab.setdefault(term, len(self.vocab)))
+                new_docs.append(base + offset)
+                new_tf.append(n)
+            new_len.append(len(tokens))
+            new_emb.append(embed(tokens))
+            self.doc_ids.append(row["conversation_id"])
+            self.customers.append(row.get("customer_name") or "")
+            date = str(row.get("conversation_date") or "")
+            if date and (self.watermark is None or date > self.watermark):
+                self.watermark = date
+
+        # merge new postings into the CSR arrays, grouped by term id
+        old_terms = np.repeat(
+            np.arange(len(self.term_offsets) - 1, dtype=np.int64),
+            np.diff(np.asarray(self.term_offsets)),
+        )
+        terms = np.concatenate([old_terms, np.asarray(new_terms, dtype=np.int64)])
+        docs  = np.concatenate([np.asarray(self.post_docs), np.asarray(new_docs, dtype=np.int32)])
+        tfs   = np.concatenate([np.asarray(self.post_tf), np.asarray(new_tf, dtype=np.float32)])
+        order = np.argsort(terms, kind="stable")
+        counts = np.bincount(terms, minlength=len(self.vocab))
+
+        self.term_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.post_docs    = docs[order]
+        self.post_tf      = tfs[order]
+        self.doc_len      = np.concatenate([np.asarray(self.doc_len), np.asarray(new_len, dtype=np.float32)])
+        self.embeddings   = np.concatenate([
+            np.asarray(self.embeddings), np.stack(new_emb).astype(np.float16)
+        ])
+        self._save()
+        return len(rows)
+
+    def update(self, session) -> int:
+        """Pull conversations at or after the watermark and index the new ones."""
+        where = ""
+        if self.watermark:
+            where = f"WHERE conversation_date >= '{self.watermark}'"
+        pdf = session.sql(f"""
+            SELECT conversation_id, transcript_text, customer_name,
+                   TO_VARCHAR(conversation_date, 'YYYY-MM-DD HH24:MI:SS') AS conversation_date
+            FROM sales_conversations
+            {where}
+            ORDER BY conversation_date
+        """).to_pandas()
+        rows = [
+            {
+                "conversation_id":   r.CONVERSATION_ID,
+                "transcript_text":   r.TRANSCRIPT_TEXT,
+                "customer_name":     r.CUSTOMER_NAME,
+                "conversation_date": r.CONVERSATION_DATE,
+            }
+            for r in pdf.itertuples(index=False)
+        ]
+        self.checked_at = time.time()
+        return self.add_documents(rows)
+
+    def maybe_update(self, session, max_age_s: float = MAX_AGE_S) -> int:
+        # claim the refresh under the lock so concurrent sessions don't all run it
+        with self._lock:
+            if time.time() - self.checked_at < max_age_s:
+                return 0
+            self.checked_at = time.time()
+        return self.update(session)
+
+    # ── search ─────────────────────────────────────────────────────────
+    def bm25_scores(self, tokens: List[str]) -> np.ndarray:
+        n = len(self.doc_ids)
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        avgdl = float(np.mean(self.doc_len)) or 1.0
+        for term in set(tokens):
+            tid = self.vocab.get(term)
+            if tid is None:
+                continue
+            lo, hi = int(self.term_offsets[tid]), int(self.term_offsets[tid + 1])
+            docs = np.asarray(self.post_docs[lo:hi])
+            tf   = np.asarray(self.post_tf[lo:hi])
+            idf  = np.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[docs] / avgdl)
+            scores[docs] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return scores
+
+    def search(self, question: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Top-k (conversation_id, fused score), BM25 and embedding ranks fused by RRF."""
+        with self._lock:
+            return self._search(question, k)
+
+    def _search(self, question: str, k: int) -> List[Tuple[str, float]]:
+        if not self.doc_ids:
+            return []
+        tokens = tokenize(question)
+        bm25   = self.bm25_scores(tokens)
+        dense  = np.asarray(self.embeddings, dtype=np.float32) @ embed(tokens)
+
+        fused = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for scores, mask in ((bm25, bm25 > 0), (dense, dense > 0)):
+            ranks = np.empty(len(scores), dtype=np.int64)
+            ranks[np.argsort(-scores, kind="stable")] = np.arange(len(scores))
+            fused += np.where(mask, 1.0 / (RRF_K + ranks + 1), 0.0)
+
+        top = np.argsort(-fused, kind="stable")[:k]
+        return [(self.doc_ids[i], float(fused[i])) for i in top if fused[i] > 0]
+
+    def citations(self, question: str, k: int = 5) -> List[Dict]:
+        """Same shape as the citations list built by process_sse_response."""
+        return [
+            {"source_id": rank, "doc_id": doc_id}
+            for rank, (doc_id, _) in enumerate(self.search(question, k), start=1)
+        ]
+
+
+# ── recall comparison against Cortex Search ─────────────────────────────
+DEFAULT_QUESTIONS = [
+    "What did SecureBank say about pricing?",
+    "What concerns did HealthTech Solutions raise about compliance?",
+    "What did TechCorp Inc say about Legacy System X migration?",
+    "Which customers discussed multi-year discounts?",
+    "What did SmallBiz Solutions mention about budget?",
+]
+
+
+def cortex_search_ids(session, question: str, k: int) -> List[str]:
+    request = json.dumps({"query": question, "columns": ["conversation_id"], "limit": k})
+    row = session.sql(
+        "SELECT SNOWFLAKE.CORTEX.SEARCH_PREVIEW(?, ?)", params=[SEARCH_SERVICE, request]
+    ).collect()[0]
+    return [r["conversation_id"] for r in json.loads(row[0]).get("results", [])]
+
+
+def compare_recall(session, index: LocalRetrievalIndex,
+                   questions: Optional[List[str]] = None, k: int = 5) -> List[Dict]:
+    """
+    Recall@k of the local engine, taking Cortex Search's top-k as the
+    reference set, plus local query latency.
+    """
+    report = []
+    for q in questions or DEFAULT_QUESTIONS:
+        reference = cortex_search_ids(session, q, k)
+        start = time.perf_counter()
+        local = [doc_id for doc_id, _ in index.search(q, k)]
+        latency_ms = (time.perf_counter() - start) * 1000
+        hits = len(set(local) & set(reference))
+        report.append({
+            "question":   q,
+            "recall":     hits / len(reference) if reference else 1.0,
+            "latency_ms": round(latency_ms, 2),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from snowflake.snowpark.context import get_active_session
+
+    session = get_active_session()
+    index = LocalRetrievalIndex.open()
+    print(f"indexed {index.update(session)} new conversations")
+    rows = compare_recall(session, index)
+    for r in rows:
+        print(f"{r['recall']:.2f}  {r['latency_ms']:>7} ms  {r['question']}")
+    print(f"mean recall@5: {sum(r['recall'] for r in rows) / len(rows):.2f}")
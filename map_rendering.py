@@ -0,0 +1,180 @@
+# map_rendering.py
+#
+# Compact pydeck rendering for many routes and stops at once (a day of
+# delivery routes: hundreds of paths, thousands of points). Routes come in
+# columnar form — one (N, 2) lat/lon array plus path offsets — and are
+# packed into one flat [lon, lat, lon, lat, ...] array per path
+# (PathLayer positionFormat "XY"), stops into bare [lon, lat] pairs read
+# with the "-" (whole datum) accessor. That removes the per-point row
+# objects and repeated column names of a DataFrame, and coordinates are
+# rounded to float32 precision (5 decimals, ~1 m) so the JSON stays short.
+#
+# st.pydeck_chart ships the deck as JSON, so typed-array (Float32Array)
+# attributes cannot be passed through; flat per-path arrays are the
+# closest equivalent that survives the JSON transport.
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pydeck as pdk
+
+DECIMALS     = 5
+ROUTE_WIDTH  = 4
+STOP_RADIUS  = 40
+STOP_COLOR   = [220, 50, 50]
+ROUTE_COLORS = [
+    [31, 119, 180], [255, 127, 14], [44, 160, 44], [148, 103, 189],
+    [140, 86, 75], [227, 119, 194], [127, 127, 127], [188, 189, 34],
+    [23, 190, 207],
+]
+
+
+def columnar_routes(routes: Sequence[Sequence[Tuple[float, float]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    [(lat, lon), ...] lists → (coords float64[N, 2], offsets int64[R + 1]),
+    where route i is coords[offsets[i]:offsets[i + 1]].
+    """
+    lengths = [len(r) for r in routes]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    if not offsets[-1]:
+        return np.zeros((0, 2)), offsets
+    coords = np.concatenate([np.asarray(r, dtype=np.float64).reshape(-1, 2) for r in routes if len(r)])
+    return coords, offsets
+
+
+def pack_paths(coords: np.ndarray, offsets: np.ndarray) -> List[dict]:
+    """One {"p": [lon, lat, ...], "c": color} row per route with 2+ points."""
+    lonlat = np.round(np.asarray(coords, dtype=np.float64)[:, ::-1], DECIMALS)
+    rows = []
+    for i in range(len(offsets) - 1):
+        lo, hi = int(offsets[i]), int(offsets[i + 1])
+        if hi - lo < 2:
+            continue
+        rows.append({"p": lonlat[lo:hi].ravel().tolist(), "c": ROUTE_COLORS[i % len(ROUTE_COLORS)]})
+    return rows
+
+
+def _drawn_coords(coords: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """The points of routes pack_paths keeps (2+ points), for view bounds."""
+    lengths = np.diff(np.asarray(offsets, dtype=np.int64))
+    return np.asarray(coords, dtype=np.float64).reshape(-1, 2)[np.repeat(lengths >= 2, lengths)]
+
+
+def pack_stops(lat: Sequence[float], lon: Sequence[float]) -> List[List[float]]:
+    return np.round(np.column_stack([lon, lat]).astype(np.float64), DECIMALS).tolist()
+
+
+def view_for(lat: np.ndarray, lon: np.ndarray) -> pdk.ViewState:
+    """Centre on the bounding box and pick a zoom that roughly fits it."""
+    if not len(lat):
+        return pdk.ViewState(latitude=0, longitude=0, zoom=1)
+    span = max(float(np.ptp(lat)), float(np.ptp(lon)), 0.005)
+    zoom = max(1.0, min(15.0, math.log2(360.0 / span) - 1.0))
+    return pdk.ViewState(
+        latitude=float((lat.min() + lat.max()) / 2),
+        longitude=float((lon.min() + lon.max()) / 2),
+        zoom=zoom,
+    )
+
+
+def build_deck(
+    coords: np.ndarray,
+    offsets: np.ndarray,
+    stops_lat: Optional[Sequence[float]] = None,
+    stops_lon: Optional[Sequence[float]] = None,
+) -> pdk.Deck:
+    layers = []
+    paths = pack_paths(coords, offsets)
+    if paths:
+        layers.append(pdk.Layer(
+            "PathLayer",
+            data=paths,
+            get_path="p",
+            get_color="c",
+            position_format="'XY'",   # quoted: a literal, not an accessor
+            width_min_pixels=2,
+            get_width=ROUTE_WIDTH,
+            pickable=False,
+        ))
+    stops_lat = np.asarray(stops_lat if stops_lat is not None else [], dtype=np.float64)
+    stops_lon = np.asarray(stops_lon if stops_lon is not None else [], dtype=np.float64)
+    if len(stops_lat):
+        layers.append(pdk.Layer(
+            "ScatterplotLayer",
+            data=pack_stops(stops_lat, stops_lon),
+            get_position="-",          # the datum itself is [lon, lat]
+            get_fill_color=STOP_COLOR,
+            get_radius=STOP_RADIUS,
+            radius_min_pixels=4,
+            pickable=False,
+        ))
+    # bounds cover what is drawn: single-point routes are not rendered
+    drawn   = _drawn_coords(coords, offsets)
+    all_lat = np.concatenate([drawn[:, 0], stops_lat])
+    all_lon = np.concatenate([drawn[:, 1], stops_lon])
+    return pdk.Deck(layers=layers, initial_view_state=view_for(all_lat, all_lon))
+
+
+def display_routes(routes, stops: Optional[Sequence[Tuple[float, float]]] = None):
+    """Render route coordinate lists and (lat, lon) stops with st.pydeck_chart."""
+    import streamlit as st
+
+    coords, offsets = columnar_routes(routes)
+    stops = np.asarray(stops if stops is not None else [], dtype=np.float64).reshape(-1, 2)
+    if not len(coords) and not len(stops):
+        st.write("No coordinates to display.")
+        return
+    st.pydeck_chart(build_deck(coords, offsets, stops[:, 0], stops[:, 1]))
+
+
+def payload_bytes(deck: pdk.Deck) -> int:
+    return len(deck.to_json().encode("utf-8"))
+
+
+def _per_point_deck(coords: np.ndarray, offsets: np.ndarray, stops: np.ndarray) -> pdk.Deck:
+    """
+    Baseline for the benchmark: the same layers and rounding, with nested
+    [[lon, lat], ...] paths and DataFrame-style {"lat", "lon"} stop rows.
+    """
+    lonlat = np.round(coords[:, ::-1], DECIMALS)
+    path_rows = [
+        {"path": lonlat[offsets[i]:offsets[i + 1]].tolist(),
+         "color": ROUTE_COLORS[i % len(ROUTE_COLORS)]}
+        for i in range(len(offsets) - 1)
+        if offsets[i + 1] - offsets[i] >= 2
+    ]
+    stop_rows = [{"lat": lat, "lon": lon} for lat, lon in np.round(stops, DECIMALS).tolist()]
+    drawn = _drawn_coords(coords, offsets)
+    return pdk.Deck(layers=[
+        pdk.Layer("PathLayer", data=path_rows, get_path="path", get_color="color",
+                  width_min_pixels=2, get_width=ROUTE_WIDTH, pickable=False),
+        pdk.Layer("ScatterplotLayer", data=stop_rows, get_position="[lon, lat]",
+                  get_fill_color=STOP_COLOR, get_radius=STOP_RADIUS,
+                  radius_min_pixels=4, pickable=False),
+    ], initial_view_state=view_for(np.concatenate([drawn[:, 0], stops[:, 0]]),
+                                   np.concatenate([drawn[:, 1], stops[:, 1]])))
+
+if __name__ == "__main__":
+    # payload size: nested [[lon, lat], ...] paths vs packed flat paths,
+    # synthetic day of routes
+    import time
+
+    rng = np.random.default_rng(0)
+    print(f"{'routes':>7}{'points':>8}{'stops':>7}{'nested KB':>14}{'packed KB':>11}{'build ms':>10}")
+    for n_routes, pts in ((1, 200), (100, 50), (300, 50), (500, 100)):
+        routes = [
+            np.column_stack([
+                34.0 + np.cumsum(rng.normal(0, 0.002, pts)) + rng.uniform(-1, 1),
+                -118.2 + np.cumsum(rng.normal(0, 0.002, pts)) + rng.uniform(-1, 1),
+            ])
+            for _ in range(n_routes)
+        ]
+        coords, offsets = columnar_routes(routes)
+        stops = coords[offsets[1:] - 1]
+        start = time.perf_counter()
+        packed = payload_bytes(build_deck(coords, offsets, stops[:, 0], stops[:, 1]))
+        build_ms = (time.perf_counter() - start) * 1000
+        baseline = payload_bytes(_per_point_deck(coords, offsets, stops))
+        print(f"{n_routes:>7}{len(coords):>8}{len(stops):>7}"
+              f"{baseline / 1024:>14.0f}{packed / 1024:>11.0f}{build_ms:>10.0f}")
@@ -0,0 +1,200 @@
+# rate_limiter.py
+#
+# Client-side token buckets for the rate-limited upstreams (HERE
+# geocoding/routing/matrix, Cortex). One scheduler per endpoint is shared by
+# every Streamlit session in the process. Callers queue for a token
+# instead of failing; interactive callers are served before background
+# ones, and background callers leave a reserve of tokens untouched. A
+# 429 that slips through pauses the bucket for Retry-After and the call
+# is retried.
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+INTERACTIVE = 0
+BACKGROUND  = 1
+
+MAX_RETRIES        = 3
+DEFAULT_RETRY_S    = 1.0
+BACKGROUND_RESERVE = 1.0   # tokens background callers must leave in the bucket
+
+# endpoint → (tokens per second, burst)
+BUDGETS: Dict[str, Tuple[float, float]] = {
+    "here_geocode": (5.0, 5.0),
+    "here_routing": (5.0, 5.0),
+    "here_matrix":  (1.0, 2.0),
+    "cortex":       (1.0, 3.0),   # Cortex agent endpoint (chat)
+    # warehouse COMPLETE SQL for bin request extraction: a separate quota,
+    # kept off the agent budget so extraction never delays the chat
+    "cortex_complete": (1.0, 2.0),
+}
+
+
+class RateLimited(Exception):
+    """Raised by an upstream call that was answered with HTTP 429."""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__(f"rate limited (retry after {retry_after or DEFAULT_RETRY_S}s)")
+        self.retry_after = retry_after if retry_after is not None else DEFAULT_RETRY_S
+
+
+def retry_after_seconds(headers: Dict) -> Optional[float]:
+    try:
+        return float((headers or {}).get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucketScheduler:
+    def __init__(self, name: str, rate: float, burst: float,
+                 reserve: float = BACKGROUND_RESERVE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name    = name
+        self.rate    = rate
+        self.burst   = burst
+        self.reserve = min(reserve, max(burst - 1.0, 0.0))
+        self._clock  = clock
+        self._tokens = burst
+        self._last   = clock()
+        self._paused_until = 0.0
+        self._cond   = threading.Condition()
+        self._queue: list = []
+        self._seq    = itertools.count()
+        self._metrics = {
+            "granted": 0, "granted_background": 0, "throttled": 0,
+            "wait_s_total": 0.0, "wait_s_max": 0.0,
+        }
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last   = now
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """
+        Block until a token is granted; returns the seconds spent queued.
+        Raises TimeoutError only when an explicit timeout elapses.
+        """
+        need   = 1.0 if priority == INTERACTIVE else 1.0 + self.reserve
+        ticket = (priority, next(self._seq))
+        start  = self._clock()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    if (self._queue[0] == ticket and now >= self._paused_until
+                            and self._tokens >= need):
+                        heapq.heappop(self._queue)
+                        self._tokens -= 1.0
+                        break
+                    if timeout is not None and now - start >= timeout:
+                        self._queue.remove(ticket)
+                        heapq.heapify(self._queue)
+                        raise TimeoutError(f"{self.name}: no token within {timeout}s")
+                    delay = max(self._paused_until - now,
+                                (need - self._tokens) / self.rate, 0.001)
+                    self._cond.wait(delay)
+            finally:
+                self._cond.notify_all()
+
+            waited = self._clock() - start
+            self._metrics["granted"] += 1
+            if priority != INTERACTIVE:
+                self._metrics["granted_background"] += 1
+            self._metrics["wait_s_total"] += waited
+            self._metrics["wait_s_max"] = max(self._metrics["wait_s_max"], waited)
+            return waited
+
+    def throttle(self, retry_after: float) -> None:
+        """The upstream answered 429: stop granting until retry_after has passed."""
+        with self._cond:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + retry_after)
+            self._tokens = 0.0
+            self._last   = now
+            self._metrics["throttled"] += 1
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            self._refill(self._clock())
+            m = dict(self._metrics)
+            m["queued"] = len(self._queue)
+            m["tokens"] = round(self._tokens, 2)
+            m["wait_s_total"] = round(m["wait_s_total"], 3)
+            m["wait_s_max"]   = round(m["wait_s_max"], 3)
+            return m
+
+
+_schedulers: Dict[str, TokenBucketScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def scheduler(endpoint: str) -> TokenBucketScheduler:
+    """The process-wide scheduler for an endpoint listed in BUDGETS."""
+    with _schedulers_lock:
+        if endpoint not in _schedulers:
+            rate, burst = BUDGETS[endpoint]
+            _schedulers[endpoint] = TokenBucketScheduler(endpoint, rate, burst)
+        return _schedulers[endpoint]
+
+
+def run(endpoint: str, fn: Callable[[], Any], priority: int = INTERACTIVE) -> Any:
+    """
+    Call fn once a token for endpoint is granted. When fn raises
+    RateLimited the bucket is paused and the call is queued again, up to
+    MAX_RETRIES times.
+    """
+    bucket = scheduler(endpoint)
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire(priority)
+        try:
+            return fn()
+        except RateLimited as e:
+            bucket.throttle(e.retry_after)
+            if attempt == MAX_RETRIES:
+                raise
+
+
+def all_metrics() -> Dict[str, Dict[str, Any]]:
+    with _schedulers_lock:
+        buckets = list(_schedulers.values())
+    return {b.name: b.metrics() for b in buckets}
+
+
+class LimitedStub:
+    """
+    Local stand-in for a rate-limited upstream: enforces its own token
+    bucket and raises RateLimited when a call exceeds it, counting
+    served and rejected calls. Used by the tests to check that a budget
+    and the 429 retry path behave before pointing the scheduler at HERE
+    or Cortex.
+    """
+
+    def __init__(self, rate: float, burst: float, latency_s: float = 0.0):
+        self.rate      = rate
+        self.burst     = burst
+        self.latency_s = latency_s
+        self.served    = 0
+        self.rejected  = 0
+        self._tokens   = burst
+        self._last     = time.monotonic()
+        self._lock     = threading.Lock()
+
+    def __call__(self) -> str:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last   = now
+            if self._tokens < 1.0:
+                self.rejected += 1
+                raise RateLimited((1.0 - self._tokens) / self.rate)
+            self._tokens -= 1.0
+            self.served  += 1
+        time.sleep(self.latency_s)
+        return "ok"
+
@@ -0,0 +1,109 @@
+# sales_rollup_benchmark.py
+#
+# Latency of the semantic model's hot aggregate questions against the
+# base SALES_METRICS table versus the SALES_METRICS_MONTHLY rollup, on
+# 10M synthetic deals in scratch tables. Result caching is disabled so
+# every run executes.
+#
+# Run as a Snowflake Python worksheet (handler: main) or with an active
+# Snowpark session.
+
+import statistics
+import time
+from snowflake.snowpark.context import get_active_session
+
+BENCH_BASE   = "sales_metrics_bench"
+BENCH_ROLLUP = "sales_metrics_monthly_bench"
+ROWS         = 10_000_000
+REPEATS      = 5
+
+# (question, SQL over the base table, equivalent SQL over the rollup)
+HOT_QUERIES = [
+    (
+        "total deal value by sales rep",
+        f"SELECT sales_rep, SUM(deal_value) FROM {BENCH_BASE} GROUP BY 1",
+        f"SELECT sales_rep, SUM(total_deal_value) FROM {BENCH_ROLLUP} GROUP BY 1",
+    ),
+    (
+        "win rate by product line",
+        f"SELECT product_line, AVG(IFF(win_status, 1, 0)) FROM {BENCH_BASE} GROUP BY 1",
+        f"SELECT product_line, SUM(IFF(win_status, deal_count, 0)) / SUM(deal_count) "
+        f"FROM {BENCH_ROLLUP} GROUP BY 1",
+    ),
+    (
+        "monthly deal value by product line, 2024",
+        f"SELECT DATE_TRUNC('month', close_date), product_line, SUM(deal_value) "
+        f"FROM {BENCH_BASE} WHERE close_date >= '2024-01-01' AND close_date < '2025-01-01' "
+        f"GROUP BY 1, 2",
+        f"SELECT close_month, product_line, SUM(total_deal_value) "
+        f"FROM {BENCH_ROLLUP} WHERE close_month >= '2024-01-01' AND close_month < '2025-01-01' "
+        f"GROUP BY 1, 2",
+    ),
+    (
+        "average deal value by stage",
+        f"SELECT sales_stage, AVG(deal_value) FROM {BENCH_BASE} GROUP BY 1",
+        f"SELECT sales_stage, SUM(total_deal_value) / SUM(deal_count) "
+        f"FROM {BENCH_ROLLUP} GROUP BY 1",
+    ),
+]
+
+
+def _setup(session) -> None:
+    session.sql(f"""
+    CREATE OR REPLACE TABLE {BENCH_BASE} AS
+    SELECT
+      'DEAL' || SEQ8()                                                        AS deal_id,
+      'Customer ' || UNIFORM(1, 50000, RANDOM())                              AS customer_name,
+      UNIFORM(5000, 250000, RANDOM())::FLOAT                                  AS deal_value,
+      DATEADD('day', UNIFORM(0, 1460, RANDOM()), '2022-01-01'::DATE)          AS close_date,
+      ARRAY_CONSTRUCT('Closed','Lost','Pending')[UNIFORM(0,2,RANDOM())]::VARCHAR AS sales_stage,
+      UNIFORM(0, 1, RANDOM()) = 1                                             AS win_status,
+      'Rep ' || UNIFORM(1, 200, RANDOM())                                     AS sales_rep,
+      ARRAY_CONSTRUCT('Enterprise Suite','Basic Package','Premium Security',
+                      'Analytics Pro','Cloud Platform')[UNIFORM(0,4,RANDOM())]::VARCHAR AS product_line
+    FROM TABLE(GENERATOR(ROWCOUNT => {ROWS}))
+    """).collect()
+    # same shape as the sales_metrics_monthly dynamic table in setup.sql
+    session.sql(f"""
+    CREATE OR REPLACE TABLE {BENCH_ROLLUP} AS
+    SELECT sales_rep, product_line, sales_stage, win_status,
+           DATE_TRUNC('month', close_date) AS close_month,
+           COUNT(*) AS deal_count, SUM(deal_value) AS total_deal_value
+    FROM {BENCH_BASE}
+    GROUP BY 1, 2, 3, 4, 5
+    """).collect()
+
+
+def _median_ms(session, sql: str) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        session.sql(sql).collect()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main(session) -> str:
+    session.sql("ALTER SESSION SET USE_CACHED_RESULT = FALSE").collect()
+    try:
+        _setup(session)
+        rollup_rows = session.table(BENCH_ROLLUP).count()
+        lines = [
+            f"{ROWS:,} deals → {rollup_rows:,} rollup rows; median of {REPEATS} runs",
+            f"{'question':<42}{'base ms':>10}{'rollup ms':>11}{'speedup':>9}",
+        ]
+        for question, base_sql, rollup_sql in HOT_QUERIES:
+            base_ms   = _median_ms(session, base_sql)
+            rollup_ms = _median_ms(session, rollup_sql)
+            lines.append(
+                f"{question:<42}{base_ms:>10.0f}{rollup_ms:>11.0f}{base_ms / rollup_ms:>8.1f}x"
+            )
+        return "\n".join(lines)
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {BENCH_ROLLUP}").collect()
+        session.sql(f"DROP TABLE IF EXISTS {BENCH_BASE}").collect()
+        session.sql("ALTER SESSION UNSET USE_CACHED_RESULT").collect()
+
+
+if __name__ == "__main__":
+    print(main(get_active_session()))
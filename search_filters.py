@@ -0,0 +1,152 @@
+# search_filters.py
+
+import re
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# ATTRIBUTES of sales_conversation_search that can be filtered on exactly
+FILTER_COLUMNS = ("sales_rep", "product_line", "deal_stage")
+DATE_COLUMN    = "conversation_date"
+# columns whose values are people's names, matched on the surname too
+LAST_WORD_COLUMNS = ("sales_rep",)
+# columns whose values are ordinary words ("demo", "discovery"): only
+# inferred from explicit wording such as "in the Demo stage"
+STAGE_COLUMNS = ("deal_stage",)
+# a year or month only narrows conversation_date when it qualifies one of these
+_CONVERSATION_NOUNS = r"(?:conversations?|calls?|meetings?|transcripts?|discussions?|chats?)"
+
+_MONTHS = {
+    m: i + 1 for i, m in enumerate([
+        "january", "february", "march", "april", "may", "june", "july",
+        "august", "september", "october", "november", "december",
+    ])
+}
+
+
+def mentioned_values(question: str, values: List[str], last_word: bool = False) -> List[str]:
+    """
+    Return the known attribute values named in the question. A value
+    matches on its full text; with last_word (rep names) a multi-word
+    value also matches on its last word when that word is unique among
+    the values. Product lines only match in full, since words like
+    "security" or "package" are common in plain questions.
+    """
+    q = question.lower()
+    found = []
+    last_words: Dict[str, List[str]] = {}
+    for v in values:
+        words = v.lower().split()
+        if len(words) > 1:
+            last_words.setdefault(words[-1], []).append(v)
+
+    for v in values:
+        if re.search(rf"\b{re.escape(v.lower())}\b", q):
+            found.append(v)
+            continue
+        words = v.lower().split()
+        if (last_word and len(words) > 1 and len(last_words[words[-1]]) == 1
+                and len(words[-1]) > 3
+                and re.search(rf"\b{re.escape(words[-1])}\b", q)):
+            found.append(v)
+    return found
+
+
+def mentioned_stages(question: str, values: List[str]) -> List[str]:
+    """
+    Stage values named explicitly as a stage: "in the Demo stage",
+    "Negotiation phase", "stage: Closing", "stage is Discovery".
+    """
+    found = []
+    for v in values:
+        name = re.escape(v.lower())
+        if re.search(rf"\b{name}\s+(?:stage|phase)\b"
+                     rf"|\b(?:stage|phase)\s*(?::|=|is\b|of\b)?\s*{name}\b",
+                     question.lower()):
+            found.append(v)
+    return found
+
+
+def _iso_date(text: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def question_date_range(question: str) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Pull a conversation_date range out of the question. Understands
+    ISO dates after since/after/before/until, and "calls in <Month>
+    <YYYY>" / "conversations in <YYYY>" — a bare year is usually the
+    topic ("budget in 2025"), not when the conversation happened.
+    Invalid dates are ignored. Returns (start, end); either bound may be
+    None.
+    """
+    q = question.lower()
+    start = end = None
+
+    m = re.search(r"\b(?:since|after|from)\s+(\d{4}-\d{2}-\d{2})", q)
+    if m:
+        start = _iso_date(m.group(1))
+    m = re.search(r"\b(?:before|until|through|to)\s+(\d{4}-\d{2}-\d{2})", q)
+    if m:
+        end = _iso_date(m.group(1))
+    if start or end:
+        return start, end
+
+    m = re.search(rf"\b{_CONVERSATION_NOUNS}\s+in\s+(" + "|".join(_MONTHS) + r")\s+(\d{4})\b", q)
+    if m:
+        month, year = _MONTHS[m.group(1)], int(m.group(2))
+        start = date(year, month, 1)
+        end   = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1))
+        return start, end
+
+    m = re.search(rf"\b{_CONVERSATION_NOUNS}\s+(?:in|during)\s+(\d{{4}})\b", q)
+    if m:
+        year = int(m.group(1))
+        return date(year, 1, 1), date(year, 12, 31)
+
+    return None, None
+
+
+def build_search_filter(
+    question: str,
+    known_values: Dict[str, List[str]],
+    selected: Optional[Dict[str, List[str]]] = None,
+    date_range: Tuple[Optional[date], Optional[date]] = (None, None),
+) -> Optional[Dict]:
+    """
+    Build a Cortex Search filter object for the cortex_search tool
+    resource. UI selections win over values mentioned in the question;
+    an explicit date_range wins over dates parsed from the question.
+    Returns None when nothing narrows the search.
+    """
+    selected = selected or {}
+    clauses: List[Dict] = []
+
+    for col in FILTER_COLUMNS:
+        known = known_values.get(col, [])
+        if selected.get(col):
+            values = selected[col]
+        elif col in STAGE_COLUMNS:
+            values = mentioned_stages(question, known)
+        else:
+            values = mentioned_values(question, known, last_word=col in LAST_WORD_COLUMNS)
+        if len(values) == 1:
+            clauses.append({"@eq": {col: values[0]}})
+        elif values:
+            clauses.append({"@or": [{"@eq": {col: v}} for v in values]})
+
+    start, end = date_range
+    if start is None and end is None:
+        start, end = question_date_range(question)
+    if start is not None:
+        clauses.append({"@gte": {DATE_COLUMN: start.isoformat()}})
+    if end is not None:
+        clauses.append({"@lte": {DATE_COLUMN: f"{end.isoformat()} 23:59:59"}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"@and": clauses}
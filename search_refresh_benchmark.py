@@ -0,0 +1,126 @@
+# search_refresh_benchmark.py
+#
+# Compares the two refresh modes documented in setup.sql for
+# sales_conversation_search, on a scratch copy so the live service is
+# not churned:
+#   - continuous: TARGET_LAG = '1 minute', batches land while indexing runs
+#   - bulk:       SUSPEND INDEXING, load every batch, RESUME INDEXING
+# For each mode it reports the time until every loaded transcript is
+# searchable and how many index refreshes were observed along the way.
+#
+# Run as a Snowflake Python worksheet (handler: main) or with an active
+# Snowpark session.
+
+import time
+from snowflake.snowpark.context import get_active_session
+
+BENCH_TABLE   = "sales_conversations_bench"
+BENCH_SERVICE = "sales_conversation_search_bench"
+WAREHOUSE     = "COMPUTE_WH"
+BATCHES       = 10
+BATCH_ROWS    = 5_000
+BATCH_PAUSE_S = 30        # time between batches, as an ingest job would
+POLL_S        = 10
+TIMEOUT_S     = 3_600
+
+
+def _reset(session) -> None:
+    session.sql(f"CREATE OR REPLACE TABLE {BENCH_TABLE} LIKE sales_conversations").collect()
+    session.sql(f"INSERT INTO {BENCH_TABLE} SELECT * FROM sales_conversations").collect()
+    session.sql(f"ALTER TABLE {BENCH_TABLE} SET CHANGE_TRACKING = TRUE").collect()
+    session.sql(f"""
+    CREATE OR REPLACE CORTEX SEARCH SERVICE {BENCH_SERVICE}
+      ON transcript_text
+      ATTRIBUTES customer_name, deal_stage, sales_rep, product_line, conversation_date, deal_value
+      WAREHOUSE = {WAREHOUSE}
+      TARGET_LAG = '1 minute'
+      AS (SELECT * FROM {BENCH_TABLE})
+    """).collect()
+
+
+def _load_batch(session, batch: int) -> None:
+    session.sql(f"""
+    INSERT INTO {BENCH_TABLE}
+    SELECT
+      'BENCH{batch:03d}_' || SEQ4(),
+      ARRAY_CONSTRUCT(
+        'Pricing follow-up with the finance team about annual billing.',
+        'Technical deep dive on API integration and data migration.',
+        'Security review covering encryption, audit logging and SOC 2.',
+        'Demo of analytics dashboards and predictive models.'
+      )[UNIFORM(0,3,RANDOM())]::VARCHAR || ' Batch {batch}, note ' || SEQ4(),
+      'Bench Customer ' || UNIFORM(1,500,RANDOM()),
+      ARRAY_CONSTRUCT('Discovery','Demo','Negotiation','Closing')[UNIFORM(0,3,RANDOM())]::VARCHAR,
+      ARRAY_CONSTRUCT('Sarah Johnson','Mike Chen','Rachel Torres','James Wilson')[UNIFORM(0,3,RANDOM())]::VARCHAR,
+      DATEADD('day', UNIFORM(0,365,RANDOM()), '2024-01-01'::TIMESTAMP),
+      UNIFORM(10000,200000,RANDOM()),
+      ARRAY_CONSTRUCT('Enterprise Suite','Basic Package','Premium Security','Analytics Pro')[UNIFORM(0,3,RANDOM())]::VARCHAR
+    FROM TABLE(GENERATOR(ROWCOUNT => {BATCH_ROWS}))
+    """).collect()
+
+
+def _service_state(session) -> dict:
+    row = session.sql(f"DESCRIBE CORTEX SEARCH SERVICE {BENCH_SERVICE}").collect()[0]
+    return {k.lower(): v for k, v in row.as_dict().items()}
+
+
+def _wait_until_indexed(session, expected_rows: int, refreshes: set) -> float:
+    start = time.time()
+    while time.time() - start < TIMEOUT_S:
+        state = _service_state(session)
+        refreshes.add(state.get("data_timestamp"))
+        if int(state.get("source_data_num_rows") or 0) >= expected_rows:
+            return time.time() - start
+        time.sleep(POLL_S)
+    raise TimeoutError(f"{BENCH_SERVICE} did not reach {expected_rows} rows")
+
+
+def run_mode(session, mode: str) -> dict:
+    _reset(session)
+    base_rows = session.table(BENCH_TABLE).count()
+    expected  = base_rows + BATCHES * BATCH_ROWS
+    refreshes: set = set()
+    _wait_until_indexed(session, base_rows, refreshes)
+    refreshes.clear()
+
+    start = time.time()
+    if mode == "bulk":
+        session.sql(f"ALTER CORTEX SEARCH SERVICE {BENCH_SERVICE} SUSPEND INDEXING").collect()
+    for batch in range(BATCHES):
+        _load_batch(session, batch)
+        if mode == "continuous":
+            refreshes.add(_service_state(session).get("data_timestamp"))
+        time.sleep(BATCH_PAUSE_S)
+    load_s = time.time() - start
+    if mode == "bulk":
+        session.sql(f"ALTER CORTEX SEARCH SERVICE {BENCH_SERVICE} RESUME INDEXING").collect()
+
+    catch_up_s = _wait_until_indexed(session, expected, refreshes)
+    refreshes.discard(None)
+    return {
+        "mode":              mode,
+        "rows_loaded":       BATCHES * BATCH_ROWS,
+        "load_seconds":      round(load_s, 1),
+        "freshness_seconds": round(load_s + catch_up_s, 1),
+        "index_refreshes":   max(len(refreshes) - 1, 0),
+    }
+
+
+def main(session) -> str:
+    try:
+        results = [run_mode(session, "continuous"), run_mode(session, "bulk")]
+    finally:
+        session.sql(f"DROP CORTEX SEARCH SERVICE IF EXISTS {BENCH_SERVICE}").collect()
+        session.sql(f"DROP TABLE IF EXISTS {BENCH_TABLE}").collect()
+
+    lines = [f"{'mode':<12}{'rows':>8}{'load s':>10}{'fresh s':>10}{'refreshes':>11}"]
+    for r in results:
+        lines.append(
+            f"{r['mode']:<12}{r['rows_loaded']:>8}{r['load_seconds']:>10}"
+            f"{r['freshness_seconds']:>10}{r['index_refreshes']:>11}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(main(get_active_session()))
@@ -150,6 +150,27 @@ VALUES
 
 ('DEAL010', 'UpgradeNow Corp', 65000, '2024-02-18', 'Pending', false, 'Rachel Torres', 'Analytics Pro');
 
+-- Monthly rollup of sales_metrics for the semantic model's hot questions
+-- (value / count / win rate by rep, product line, stage, month). Registered
+-- as SALES_METRICS_MONTHLY in sales_metrics_model.yaml so Cortex Analyst can
+-- answer aggregates from the rollup instead of scanning every deal.
+-- sales_rollup_benchmark.py compares the two at 10M synthetic deals.
+CREATE OR REPLACE DYNAMIC TABLE sales_metrics_monthly
+  TARGET_LAG = '10 minutes'
+  WAREHOUSE = COMPUTE_WH
+  REFRESH_MODE = INCREMENTAL
+AS
+SELECT
+    sales_rep,
+    product_line,
+    sales_stage,
+    win_status,
+    DATE_TRUNC('month', close_date) AS close_month,
+    COUNT(*)                        AS deal_count,
+    SUM(deal_value)                 AS total_deal_value
+FROM sales_metrics
+GROUP BY sales_rep, product_line, sales_stage, win_status, DATE_TRUNC('month', close_date);
+
 
 
 INSERT INTO emails_webinar_202508 (
@@ -298,6 +319,55 @@ FROM TABLE(GENERATOR(ROWCOUNT => 100));
 
 ALTER TABLE emails_webinar_202508 SET CHANGE_TRACKING = TRUE;
 
+-- Delivery locations of bin requests, filled by the geocode_bin_requests
+-- job below (one row per message; status ok / not_found / no_address)
+CREATE TABLE IF NOT EXISTS bin_request_locations (
+    message_id   VARCHAR(255),
+    address      VARCHAR(1000),
+    address_key  VARCHAR(1000),
+    lat          FLOAT,
+    lon          FLOAT,
+    status       VARCHAR(20),
+    geocoded_at  TIMESTAMP_NTZ
+);
+
+-- Depots and the precomputed depot × frequent-customer distance table,
+-- rows replaced (truncate + insert) by the refresh_depot_matrix job below
+CREATE TABLE IF NOT EXISTS depots (
+    depot_id  VARCHAR(50),
+    name      VARCHAR(255),
+    address   VARCHAR(1000),
+    lat       FLOAT,
+    lon       FLOAT
+);
+
+-- MERGE so re-running this script does not duplicate depots
+MERGE INTO depots d
+USING (
+    SELECT column1 AS depot_id, column2 AS name, column3 AS address,
+           column4 AS lat, column5 AS lon
+    FROM VALUES
+    ('LAX', 'SnowBins Los Angeles', '2000 E 7th St, Los Angeles, CA',     34.0337, -118.2346),
+    ('SFO', 'SnowBins Bay Area',    '1600 Davidson Ave, San Francisco, CA', 37.7404, -122.3857),
+    ('SAC', 'SnowBins Sacramento',  '800 Richards Blvd, Sacramento, CA',  38.5945, -121.4892)
+) s
+ON d.depot_id = s.depot_id
+WHEN MATCHED THEN UPDATE SET
+    name = s.name, address = s.address, lat = s.lat, lon = s.lon
+WHEN NOT MATCHED THEN INSERT (depot_id, name, address, lat, lon)
+    VALUES (s.depot_id, s.name, s.address, s.lat, s.lon);
+
+CREATE TABLE IF NOT EXISTS depot_customer_matrix (
+    depot_id     VARCHAR(50),
+    address_key  VARCHAR(1000),
+    lat          FLOAT,
+    lon          FLOAT,
+    distance_m   FLOAT,
+    duration_s   FLOAT,
+    source       VARCHAR(10),    -- here / approx
+    computed_at  TIMESTAMP_NTZ
+);
+
 
 -- Enable change tracking
 ALTER TABLE sales_conversations SET CHANGE_TRACKING = TRUE;
@@ -323,6 +393,27 @@ CREATE OR REPLACE CORTEX SEARCH SERVICE sales_conversation_search
     WHERE conversation_date >= '2024-01-01'  -- Fixed date instead of CURRENT_TIMESTAMP
 );
 
+-- Refresh modes for sales_conversation_search
+-- The app pushes sales_rep / product_line / deal_stage / conversation_date
+-- filters into the cortex_search tool resource, so those columns must stay
+-- in ATTRIBUTES above.
+--
+-- Interactive (default): TARGET_LAG = '1 minute' keeps single transcripts
+-- searchable almost immediately.
+--
+-- Bulk load: when loading many transcripts, suspend indexing so the service
+-- refreshes once after the load instead of once per lag window while the
+-- load is still running. search_refresh_benchmark.py measures both modes
+-- on a scratch copy of the table.
+--
+--   ALTER CORTEX SEARCH SERVICE sales_conversation_search SUSPEND INDEXING;
+--   COPY INTO sales_conversations FROM @transcripts_stage ...;  -- or INSERT
+--   ALTER CORTEX SEARCH SERVICE sales_conversation_search RESUME INDEXING;
+--
+-- For a steady stream of batch loads, widen the lag instead:
+--
+--   ALTER CORTEX SEARCH SERVICE sales_conversation_search SET TARGET_LAG = '1 hour';
+
 CREATE OR REPLACE PNP.ETREMBLAY.MODELSACE STAGE models
     DIRECTORY = (ENABLE = TRUE);
 
@@ -334,7 +425,7 @@ CREATE OR REPLACE PNP.ETREMBLAY.MODELSACE STAGE models
 CREATE OR REPLACE NETWORK RULE here_api_rules  
 MODE = EGRESS  
 TYPE = HOST_PORT  
-VALUE_LIST = ('router.hereapi.com','geocode.search.hereapi.com');
+VALUE_LIST = ('router.hereapi.com','geocode.search.hereapi.com','matrix.router.hereapi.com');
 
 CREATE OR REPLACE SECRET here_api_key  
 TYPE = GENERIC_STRING  
@@ -349,6 +440,52 @@ GRANT READ ON SECRET here_api_key TO ROLE PNP;
 
 GRANT USAGE ON INTEGRATION here_api_access_int TO ROLE PNP;
 
+-- Batch geocoding of bin request addresses
+-- Upload bin_request_geocoding.py, here_api.py, rate_limiter.py and
+-- single_flight.py to @code, then schedule the procedure. The procedure
+-- has its own HERE rate buckets, separate from the Streamlit app's.
+CREATE STAGE IF NOT EXISTS code;
+
+CREATE OR REPLACE PROCEDURE geocode_bin_requests(batch_size NUMBER)
+  RETURNS VARIANT
+  LANGUAGE PYTHON
+  RUNTIME_VERSION = '3.11'
+  PACKAGES = ('snowflake-snowpark-python', 'requests')
+  IMPORTS = ('@code/bin_request_geocoding.py', '@code/here_api.py',
+             '@code/rate_limiter.py', '@code/single_flight.py')
+  HANDLER = 'bin_request_geocoding.main'
+  EXTERNAL_ACCESS_INTEGRATIONS = (here_api_access_int)
+  SECRETS = ('here_api_key' = here_api_key);
+
+CREATE OR REPLACE TASK geocode_bin_requests_task
+  WAREHOUSE = COMPUTE_WH
+  SCHEDULE = '15 MINUTE'
+AS
+  CALL geocode_bin_requests(500);
+
+ALTER TASK geocode_bin_requests_task RESUME;
+
+-- Depot × customer distance matrix, refreshed nightly after geocoding.
+-- Also upload distance_matrix.py to @code.
+CREATE OR REPLACE PROCEDURE refresh_depot_matrix(use_here BOOLEAN)
+  RETURNS VARIANT
+  LANGUAGE PYTHON
+  RUNTIME_VERSION = '3.11'
+  PACKAGES = ('snowflake-snowpark-python', 'requests', 'numpy', 'pandas')
+  IMPORTS = ('@code/distance_matrix.py', '@code/bin_request_geocoding.py',
+             '@code/here_api.py', '@code/rate_limiter.py', '@code/single_flight.py')
+  HANDLER = 'distance_matrix.main'
+  EXTERNAL_ACCESS_INTEGRATIONS = (here_api_access_int)
+  SECRETS = ('here_api_key' = here_api_key);
+
+CREATE OR REPLACE TASK refresh_depot_matrix_task
+  WAREHOUSE = COMPUTE_WH
+  SCHEDULE = 'USING CRON 0 3 * * * America/Los_Angeles'
+AS
+  CALL refresh_depot_matrix(TRUE);
+
+ALTER TASK refresh_depot_matrix_task RESUME;
+
 --Get Streamlit ID 
 SHOW STREAMLITS IN SCHEMA PNP.ETREMBLAY;
 
@@ -0,0 +1,88 @@
+# single_flight.py
+#
+# Process-wide request coalescing. Streamlit runs every session in the
+# same Python process, so identical Cortex agent or HERE requests issued
+# by several reviewers at once can share one upstream call: the first
+# caller (the leader) runs it, later callers with the same key wait for
+# the leader and receive a copy of its result (or its exception).
+
+import copy
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict
+
+
+def request_key(*parts: Any) -> str:
+    """Stable key for a normalized request payload."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done   = threading.Event()
+        self.result = None
+        self.error  = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name   = name
+        self._lock  = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {"calls": 0, "upstream": 0, "coalesced": 0, "errors": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["upstream"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+            # followers copy from a snapshot so the leader may mutate its own
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+_registry: Dict[str, SingleFlight] = {}
+_registry_lock = threading.Lock()
+
+
+def flight(name: str) -> SingleFlight:
+    """The process-wide SingleFlight group for an upstream endpoint."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = SingleFlight(name)
+        return _registry[name]
+
+
+def all_stats() -> Dict[str, Dict[str, int]]:
+    with _registry_lock:
+        groups = list(_registry.values())
+    return {g.name: g.stats() for g in groups}
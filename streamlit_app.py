@@ -2,8 +2,9 @@ import streamlit as st
 import json
 import pandas as pd
 import re
+import _snowflake
 from snowflake.snowpark.context import get_active_session
-from bin_request_retrieval import fetch_bin_requests, mark_request_read
+from bin_request_retrieval import fetch_bin_requests, mark_requests_read
 from call_here_api import (
     call_routing_here_api,
     call_routing_here_api_v7,
@@ -12,6 +13,13 @@ from call_here_api import (
     decode_shape,
     display_map,
 )
+from map_rendering import display_routes
+from search_filters import FILTER_COLUMNS, build_search_filter
+from local_retrieval import LocalRetrievalIndex, is_lookup_question
+from single_flight import all_stats, flight, request_key
+from rate_limiter import RateLimited, all_metrics, retry_after_seconds, run
+from bin_request_geocoding import address_key, find_addresses, lookup_coordinates
+from distance_matrix import DistanceMatrix
 
 session = get_active_session()
 
@@ -22,6 +30,26 @@ SEMANTIC_MODELS        = "@pnp.etremblay.models/sales_metrics_model.yaml"
 CORTEX_MODEL           = "claude-4-sonnet"
 
 
+def send_agent_request(payload):
+    """
+    POST to the Cortex agent endpoint. Identical in-flight payloads from
+    concurrent sessions share a single upstream call, which waits for a
+    token from the shared "cortex" budget.
+    """
+    def _post():
+        resp = _snowflake.send_snow_api_request(
+            "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
+        )
+        if resp.get("status") == 429:
+            raise RateLimited(retry_after_seconds(resp.get("headers")))
+        return resp
+
+    try:
+        return flight("cortex_agent").do(request_key(payload), lambda: run("cortex", _post))
+    except RateLimited:
+        return {"status": 429, "content": ""}
+
+
 def process_sse_response(events):
     text, sql, citations = "", "", []
     for evt in events:
@@ -51,6 +79,40 @@ def run_snowflake_query(sql):
         return None
 
 
+def render_citations(citations):
+    st.write("Citations:")
+    for c in citations:
+        label  = str(c["source_id"] or "source")
+        doc_id = c["doc_id"]
+        q      = (
+            "SELECT transcript_text "
+            "FROM sales_conversations "
+            f"WHERE conversation_id = '{doc_id}'"
+        )
+        df2    = run_snowflake_query(q)
+        transcript = "No transcript available"
+        if df2 is not None:
+            pdf2 = df2.to_pandas()
+            if not pdf2.empty:
+                transcript = pdf2.iloc[0,0]
+        with st.expander(label):
+            st.write(transcript)
+
+
+@st.cache_resource
+def local_index():
+    return LocalRetrievalIndex.open()
+
+
+def local_lookup(query, k=5):
+    """Citations from the local index, or None when the agent should answer."""
+    if not st.session_state.get("local_fast_path") or not is_lookup_question(query):
+        return None
+    index = local_index()
+    index.maybe_update(session)
+    return index.citations(query, k) or None
+
+
 def extract_addresses(text):
     prompt = (
         "Extract every full street address from this text and output only "
@@ -64,9 +126,7 @@ def extract_addresses(text):
             {"role":"user","content":[{"type":"text","text":prompt}]}
         ],
     }
-    resp = _snowflake.send_snow_api_request(
-        "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
-    )
+    resp = send_agent_request(payload)
     if resp.get("status") != 200:
         st.error(f"Agent error: {resp.get('status')}")
         return []
@@ -86,6 +146,10 @@ def extract_addresses(text):
 
 
 def geocode_address(addr):
+    # coordinates precomputed by the batch geocoding job skip HERE entirely
+    known = lookup_coordinates(session, [addr]).get(address_key(addr))
+    if known:
+        return known
     try:
         geo = call_geocoding_here_api(addr)
         items = geo.get("items") or []
@@ -98,17 +162,120 @@ def geocode_address(addr):
         return None, None
 
 
+@st.cache_data(ttl=300, show_spinner="Extracting bin requests…")
+def pending_bin_requests():
+    """
+    Extracted bin requests, shared by every session and refreshed every
+    few minutes, so the COMPLETE call is not repeated on each rerun.
+    """
+    return fetch_bin_requests()
+
+
+def mark_handled(req):
+    """Mark a request's messages read and drop it from every reviewer's list."""
+    mark_requests_read(req.get("message_ids") or [req["message_id"]])
+    st.session_state.setdefault("handled_requests", set()).add(req["message_id"])
+    pending_bin_requests.clear()
+
+
+@st.cache_resource(ttl=3600)
+def depot_matrix():
+    return DistanceMatrix.load(session)
+
+
+def is_depot_question(query):
+    return re.search(r"\bdepots?\b", query, flags=re.IGNORECASE) is not None
+
+
+def handle_depot_question(query, addresses):
+    """
+    Distances from depots, answered from the precomputed matrix. Returns
+    the answer text, or None when it could not be answered.
+    """
+    matrix = depot_matrix()
+    if not matrix.depot_ids:
+        st.error("No depots are configured.")
+        return None
+    named  = [d for d in matrix.depot_ids
+              if re.search(rf"\b({re.escape(d)}|{re.escape(matrix.depot_names[d])})\b", query, flags=re.IGNORECASE)]
+
+    points = []
+    for addr in addresses:
+        j = matrix.customer_for(addr)
+        if j is not None:
+            points.append(tuple(matrix.customer_coords[j]))
+        else:
+            points.append(geocode_address(addr))
+    if any(lat is None for lat, _ in points):
+        st.error("Could not locate one or more addresses.")
+        return None
+
+    if len(addresses) == 1:
+        (lat, lon), addr = points[0], addresses[0]
+        if named:
+            leg = matrix.from_depot(named[0], addr, lat, lon)
+            leg = (named[0], *leg) if leg is not None else None
+        else:
+            leg = matrix.nearest_depot(addr, lat, lon)
+        if leg is None:
+            st.error("No depot distance available for this address.")
+            return None
+        depot, dist, dur, source = leg
+        text = (f"🚚 **{addr}** is {dist / 1000:.1f} km / {dur / 60:.0f} min "
+                f"from {matrix.depot_names[depot]} ({source})")
+        st.write(text)
+        depot_pt = tuple(matrix.depot_coords[matrix.depot_index[depot]])
+        display_routes([], stops=[depot_pt, (lat, lon)])
+        return text
+
+    if named:
+        depot = named[0]
+    else:
+        nearest = matrix.nearest_depot(addresses[0], *points[0])
+        if nearest is None:
+            st.error("No depot distance available for the first stop.")
+            return None
+        depot = nearest[0]
+    order, dist, dur = matrix.plan_stops(depot, points)
+    lines = [f"🚚 Suggested order from {matrix.depot_names[depot]} "
+             f"(~{dist / 1000:.1f} km, ~{dur / 60:.0f} min):"]
+    lines += [f"{n}. {addresses[k]}" for n, k in enumerate(order, start=1)]
+    for line in lines:
+        st.write(line)
+    depot_pt = tuple(matrix.depot_coords[matrix.depot_index[depot]])
+    tour     = [depot_pt] + [points[k] for k in order]
+    display_routes([tour], stops=tour)
+    return "\n".join(lines)
+
+
+def answer_depot_question(query):
+    """
+    Depot questions whose addresses are written out in full are answered
+    from the matrix before any Cortex call. Returns the answer text, or
+    None to fall through to the agent.
+    """
+    if not is_depot_question(query):
+        return None
+    addresses = find_addresses(query)
+    if not addresses:
+        return None
+    return handle_depot_question(query, addresses)
+
+
 def handle_address_logic(query, assistant_text):
     addresses = extract_addresses(query)
     if not addresses:
         m = re.search(r"between\s+(.*?)\s+and\s+(.*)", query, flags=re.IGNORECASE)
         if m:
             addresses = [m.group(1).strip(" ,."), m.group(2).strip(" ,.")]
+    if addresses and is_depot_question(query):
+        handle_depot_question(query, addresses)
+        return
     if len(addresses) == 1:
         lat, lon = geocode_address(addresses[0])
         if lat is not None:
             st.write(f"📍 Map for: **{addresses[0]}**")
-            st.map(pd.DataFrame({"lat":[lat],"lon":[lon]}))
+            display_routes([], stops=[(lat, lon)])
     elif len(addresses) == 2:
         lat1, lon1 = geocode_address(addresses[0])
         lat2, lon2 = geocode_address(addresses[1])
@@ -124,14 +291,21 @@ def handle_address_logic(query, assistant_text):
         display_map(coords)
 
 
-def snowflake_api_call(query, limit=10):
+@st.cache_data(ttl=600)
+def search_attribute_values():
+    """Distinct values of the filterable search attributes, for UI + parsing."""
+    cols = ", ".join(f"ARRAY_AGG(DISTINCT {c})" for c in FILTER_COLUMNS)
+    row  = session.sql(f"SELECT {cols} FROM sales_conversations").collect()[0]
+    return {c: sorted(json.loads(row[i] or "[]")) for i, c in enumerate(FILTER_COLUMNS)}
+
+
+def snowflake_api_call(query, limit=10, search_filter=None):
     payload = {
         "model": "claude-4-sonnet",
         "messages": [{"role":"user","content":[{"type":"text","text":query}]}],
         "tools": [
             {"tool_spec":{"type":"cortex_analyst_text_to_sql","name":"analyst1"}},
-            {"tool_spec":{"type":"cortex_search","name":"search1"}},
-            {"tool_spec":{"type":"http_request","name":"here_maps"}}
+            {"tool_spec":{"type":"cortex_search","name":"search1"}}
         ],
         "tool_resources": {
             "analyst1":{"semantic_model_file":SEMANTIC_MODELS},
@@ -142,10 +316,10 @@ def snowflake_api_call(query, limit=10):
             }
         }
     }
+    if search_filter:
+        payload["tool_resources"]["search1"]["filter"] = search_filter
     try:
-        resp = _snowflake.send_snow_api_request(
-            "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
-        )
+        resp = send_agent_request(payload)
         if resp["status"] != 200:
             st.error(f"HTTP Error: {resp['status']}")
             return None
@@ -158,6 +332,39 @@ def snowflake_api_call(query, limit=10):
 def main():
     st.title("Webinar Intelligent Sales Assistant")
 
+    # sidebar: reset conversation + search filters
+    with st.sidebar:
+        if st.button("New Conversation", key="new_chat"):
+            st.session_state.messages = []
+            st.rerun()
+
+        st.checkbox("Local fast path for lookups", key="local_fast_path")
+
+        with st.expander("Upstream calls"):
+            stats = all_stats()
+            if stats:
+                st.dataframe(pd.DataFrame(stats).T)
+            metrics = all_metrics()
+            if metrics:
+                st.write("Rate limits")
+                st.dataframe(pd.DataFrame(metrics).T)
+
+        with st.expander("Search filters"):
+            known = search_attribute_values()
+            st.session_state.search_selected = {
+                col: st.multiselect(col.replace("_", " ").title(), known[col], key=f"flt_{col}")
+                for col in FILTER_COLUMNS
+            }
+            use_dates = st.checkbox("Restrict conversation dates", key="flt_use_dates")
+            if use_dates:
+                dates = st.date_input("Conversation date range", value=(), key="flt_dates")
+                if isinstance(dates, (list, tuple)) and len(dates) == 2:
+                    st.session_state.search_dates = tuple(dates)
+                else:
+                    st.session_state.search_dates = (None, None)
+            else:
+                st.session_state.search_dates = (None, None)
+
     tab1, tab2 = st.tabs(["Review Requests","Assistant"])
 
     # ── Tab 1: Review new bin requests ─────────────────────────────────
@@ -165,8 +372,14 @@ def main():
         st.header("📥 Review New Bin Requests")
         if "req_idx" not in st.session_state:
             st.session_state.req_idx = 0
+        if st.button("🔄 Refresh requests", key="req_refresh"):
+            pending_bin_requests.clear()
+            st.session_state.req_idx = 0
 
-        requests = fetch_bin_requests()
+        # requests this session already approved/rejected stay hidden even
+        # if another session refilled the cache before the read flag landed
+        handled  = st.session_state.setdefault("handled_requests", set())
+        requests = [r for r in pending_bin_requests() if r["message_id"] not in handled]
         idx      = st.session_state.req_idx
 
         if not requests:
@@ -179,6 +392,8 @@ def main():
 
             st.subheader(f"Request {idx+1}/{len(requests)}: {mid}")
             st.markdown(f"> {req['raw_body']}")
+            if len(req.get("message_ids", [])) > 1:
+                st.caption(f"Covers {len(req['message_ids'])} messages (thread replies / duplicates).")
 
             # DEBUG: show entire dict so we can see what's actually returned
             st.write("🔍 Full request dict:", req)
@@ -197,12 +412,16 @@ def main():
             date  = st.text_input("Date Needed",      value=req.get("date_needed",""),      key=f"date_{mid}")
             user  = st.text_input("Requester",        value=req.get("requester",""),        key=f"req_{mid}")
 
+            if req.get("lat") is not None:
+                st.write(f"📍 Delivery: **{req['delivery_address']}**")
+                display_routes([], stops=[(req["lat"], req["lon"])])
+
             c1, c2, c3 = st.columns(3)
             if c1.button("✅ Approve", key=f"app_{mid}"):
-                mark_request_read(mid)
+                mark_handled(req)
                 st.success("Approved")
             if c2.button("❌ Reject", key=f"rej_{mid}"):
-                mark_request_read(mid)
+                mark_handled(req)
                 st.warning("Rejected")
             if c3.button("➡️ Next", key=f"next_{mid}"):
                 st.session_state.req_idx += 1
@@ -220,57 +439,48 @@ def main():
         if st.button("Send", key="chat_send") and query:
             st.session_state.messages.append({"role":"user","content":query})
 
-            resp = _snowflake.send_snow_api_request(
-                "POST", API_ENDPOINT, {}, {}, {
-                    "model": CORTEX_MODEL,
-                    "messages":[{"role":"user","content":[{"type":"text","text":query}]}]
-                }, None, API_TIMEOUT
+            search_filter = build_search_filter(
+                query,
+                search_attribute_values(),
+                selected=st.session_state.get("search_selected"),
+                date_range=st.session_state.get("search_dates", (None, None)),
             )
-            try:
-                events = json.loads(resp.get("content","[]"))
-            except:
-                events = []
-
-            text, sql, citations = process_sse_response(events)
-
-            if text:
+            if search_filter:
+                with st.expander("Search filter"):
+                    st.json(search_filter)
+
+            depot_answer = answer_depot_question(query)
+            # attribute filters are only applied by Cortex Search
+            fast = None if search_filter or depot_answer else local_lookup(query)
+            if depot_answer:
+                st.session_state.messages.append({"role":"assistant","content":depot_answer})
+                st.caption("Answered from the depot distance matrix.")
+            elif fast:
+                text = "Relevant conversations: " + ", ".join(c["doc_id"] for c in fast)
                 st.session_state.messages.append({"role":"assistant","content":text})
                 st.markdown(f"**Assistant:** {text}")
-
-                if citations:
-                    st.write("Citations:")
-                    for c in citations:
-                        label  = c["source_id"] or "source"
-                        doc_id = c["doc_id"]
-                        q      = (
-                            "SELECT transcript_text "
-                            "FROM sales_conversations "
-                            f"WHERE conversation_id = '{doc_id}'"
-                        )
-                        df2    = run_snowflake_query(q)
-                        transcript = "No transcript available"
-                        if df2 is not None:
-                            pdf2 = df2.to_pandas()
-                            if not pdf2.empty:
-                                transcript = pdf2.iloc[0,0]
-                        with st.expander(label):
-                            st.write(transcript)
-
-                handle_address_logic(query, text)
-
-            if sql:
-                st.markdown("### Generated SQL")
-                st.code(sql, language="sql")
-                df3 = run_snowflake_query(sql)
-                if df3 is not None:
-                    st.write("### Results")
-                    st.dataframe(df3)
-
-    # sidebar: reset conversation
-    with st.sidebar:
-        if st.button("New Conversation", key="new_chat"):
-            st.session_state.messages = []
-            st.rerun()
+                st.caption("Answered from the local transcript index.")
+                render_citations(fast)
+            else:
+                events = snowflake_api_call(query, search_filter=search_filter) or []
+                text, sql, citations = process_sse_response(events)
+
+                if text:
+                    st.session_state.messages.append({"role":"assistant","content":text})
+                    st.markdown(f"**Assistant:** {text}")
+
+                    if citations:
+                        render_citations(citations)
+
+                    handle_address_logic(query, text)
+
+                if sql:
+                    st.markdown("### Generated SQL")
+                    st.code(sql, language="sql")
+                    df3 = run_snowflake_query(sql)
+                    if df3 is not None:
+                        st.write("### Results")
+                        st.dataframe(df3)
 
 
 if __name__ == "__main__":
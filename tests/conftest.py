@@ -0,0 +1,9 @@
+# conftest.py
+#
+# The app modules live at the repository root (they are uploaded flat to
+# the Streamlit stage), so make them importable from the tests.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
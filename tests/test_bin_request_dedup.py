@@ -0,0 +1,83 @@
+# test_bin_request_dedup.py
+
+from datetime import datetime, timedelta
+
+from bin_request_dedup import group_messages
+
+REQUEST = ("I need two 20 yard roll-off bins for 7 days at 123 Oak St, Fresno, CA "
+           "starting next Monday for a kitchen renovation.")
+VAGUE   = "I need a few bins for green waste early September at my usual location. Cheers"
+
+_T0 = datetime(2025, 8, 1, 9, 0)
+
+
+def _msg(i, body, sender, thread=None):
+    return {
+        "message_id":   f"m{i}",
+        "thread_id":    thread or f"t{i}",
+        "from_address": sender,
+        "body":         body,
+        "sent_at":      _T0 + timedelta(minutes=i),
+    }
+
+
+def _ids(groups):
+    return sorted(sorted(g["message_ids"]) for g in groups)
+
+
+def test_forward_from_same_sender_is_merged():
+    groups = group_messages([
+        _msg(1, REQUEST, "ann@acme.com"),
+        _msg(2, "---------- Forwarded message ---------\nFrom: Ann <ann@acme.com>\n"
+                "Subject: Bin request\n" + REQUEST, "Ann@Acme.com "),
+    ])
+    assert _ids(groups) == [["m1", "m2"]]
+    assert groups[0]["message_id"] == "m2"
+
+
+def test_same_thread_is_merged_regardless_of_body():
+    groups = group_messages([
+        _msg(1, REQUEST, "ann@acme.com", thread="t"),
+        _msg(2, "Any update?", "ann@acme.com", thread="t"),
+    ])
+    assert _ids(groups) == [["m1", "m2"]]
+    assert groups[0]["context"] == [REQUEST]
+
+
+def test_similar_bodies_from_different_senders_stay_apart():
+    groups = group_messages([
+        _msg(1, "Hi team, " + VAGUE, "ann@acme.com"),
+        _msg(2, "Hello there, " + VAGUE, "bob@example.com"),
+    ])
+    assert _ids(groups) == [["m1"], ["m2"]]
+
+
+def test_repeat_order_for_another_date_stays_apart():
+    order = ("Hello SnowBins team, we are renovating the kitchen and need one 20 yard "
+             "roll-off container for general construction debris at 123 Oak St, Fresno, CA. "
+             "Please deliver on {} in the morning and leave it for seven days before "
+             "pickup. Thanks, Ann Lee, Acme Builders")
+    groups = group_messages([
+        _msg(1, order.format("2025-08-05"), "ann@acme.com"),
+        _msg(2, order.format("2025-08-19"), "ann@acme.com"),
+        _msg(3, order.format("2025-08-19"), "ann@acme.com"),
+    ])
+    assert _ids(groups) == [["m1"], ["m2", "m3"]]
+
+
+def test_empty_and_short_bodies_are_not_duplicates():
+    groups = group_messages([
+        _msg(1, "", "ann@acme.com"),
+        _msg(2, "", "ann@acme.com"),
+        _msg(3, "Thanks!", "ann@acme.com"),
+        _msg(4, "Thanks!", "ann@acme.com"),
+    ])
+    assert _ids(groups) == [["m1"], ["m2"], ["m3"], ["m4"]]
+
+
+def test_missing_sender_only_groups_by_thread():
+    groups = group_messages([
+        _msg(1, REQUEST, None),
+        _msg(2, REQUEST, None),
+    ])
+    assert _ids(groups) == [["m1"], ["m2"]]
@@ -0,0 +1,40 @@
+# test_bin_request_geocoding.py
+
+import pytest
+
+pytest.importorskip("snowflake.snowpark")
+
+from bin_request_geocoding import address_key, extract_delivery_address, find_addresses  # noqa: E402
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("How do I get 2 bins to 123 Oak St, Fresno, CA from the LAX depot?",
+     ["123 Oak St, Fresno, CA"]),
+    ("In 2025 which depot is closest to 45 Elm Dr, Irvine, CA",
+     ["45 Elm Dr, Irvine, CA"]),
+    ("Route from the LAX depot to 1 A St, Fresno, CA and 22 B Ave, Fresno, CA 93721",
+     ["1 A St, Fresno, CA", "22 B Ave, Fresno, CA 93721"]),
+    ("How far is 456 Rue Example Montréal QC H2X 1Y4 from the nearest depot?",
+     ["456 Rue Example Montréal QC H2X 1Y4"]),
+    ("Deliver to 12 Rue de la Montagne, Montréal, QC H3G 1Z5 tomorrow",
+     ["12 Rue de la Montagne, Montréal, QC H3G 1Z5"]),
+    ("Which depot is closest to my usual site?", []),
+])
+def test_find_addresses(text, expected):
+    assert find_addresses(text) == expected
+
+
+@pytest.mark.parametrize("body, expected", [
+    ("Two 20 yard bins for 7 days at 123 Oak St, Fresno, CA starting Monday.",
+     "123 Oak St, Fresno, CA"),
+    ("Please drop it at 456 Rue Example Montréal QC H2X 1Y4, thanks",
+     "456 Rue Example Montréal QC H2X 1Y4"),
+    ("I need a few bins for green waste at my usual location, Fresno, CA", None),
+    ("Can you come at 5 PM on Monday, we'd like delivery in Fresno, CA", None),
+])
+def test_extract_delivery_address(body, expected):
+    assert extract_delivery_address(body) == expected
+
+
+def test_address_key_normalizes_case_and_spacing():
+    assert address_key("  123  Oak St, Fresno, CA. ") == "123 oak st, fresno, ca"
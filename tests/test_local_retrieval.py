@@ -0,0 +1,69 @@
+# test_local_retrieval.py
+
+import numpy as np
+
+from local_retrieval import LocalRetrievalIndex, is_lookup_question
+
+FIRST = [
+    ("c1", "SecureBank",   "2024-01-05", "Security review of encryption at rest and SOC 2 audit logging."),
+    ("c2", "RetailCo",     "2024-01-09", "Pricing follow-up on annual billing and volume discounts."),
+    ("c3", "HealthPlus",   "2024-01-12", "Demo of analytics dashboards for patient outcomes."),
+]
+LATER = [
+    ("c4", "LogiTrans",    "2024-02-02", "Data migration plan and API integration timeline."),
+    ("c5", "SecureBank",   "2024-02-10", "Follow-up on encryption key rotation and audit logging."),
+]
+
+
+def _rows(docs):
+    return [
+        {"conversation_id": cid, "customer_name": cust,
+         "conversation_date": f"{day} 10:00:00", "transcript_text": text}
+        for cid, cust, day, text in docs
+    ]
+
+
+def _top(index, question, k=5):
+    return [doc_id for doc_id, _ in index.search(question, k)]
+
+
+def test_build_reopen_append_and_search(tmp_path):
+    path = str(tmp_path / "index")
+    index = LocalRetrievalIndex(path)
+    assert index.add_documents(_rows(FIRST)) == 3
+    assert _top(index, "volume discounts on annual billing")[0] == "c2"
+
+    reopened = LocalRetrievalIndex.open(path)
+    assert reopened.doc_ids == ["c1", "c2", "c3"]
+    assert reopened.watermark == "2024-01-12 10:00:00"
+    assert isinstance(reopened.post_docs, np.memmap)
+    assert _top(reopened, "volume discounts on annual billing")[0] == "c2"
+
+    # already-indexed ids are skipped, new ones merged into the postings
+    assert reopened.add_documents(_rows(FIRST[:1] + LATER)) == 2
+    assert reopened.doc_ids == ["c1", "c2", "c3", "c4", "c5"]
+    assert reopened.watermark == "2024-02-10 10:00:00"
+    offsets = np.asarray(reopened.term_offsets)
+    assert offsets[-1] == len(reopened.post_docs) == len(reopened.post_tf)
+    assert np.all(np.diff(offsets) >= 0)
+
+    # customer names are indexed with the transcript
+    assert set(_top(reopened, "What did SecureBank say about encryption?", k=2)) == {"c1", "c5"}
+    assert _top(reopened, "API integration and data migration")[0] == "c4"
+
+    final = LocalRetrievalIndex.open(path)
+    assert _top(final, "API integration and data migration")[0] == "c4"
+    assert final.citations("API integration and data migration", k=1) == \
+        [{"source_id": 1, "doc_id": "c4"}]
+
+
+def test_search_on_empty_index(tmp_path):
+    index = LocalRetrievalIndex.open(str(tmp_path / "missing"))
+    assert index.search("anything") == []
+    assert index.add_documents([]) == 0
+
+
+def test_is_lookup_question():
+    assert is_lookup_question("What did SecureBank say about encryption?")
+    assert not is_lookup_question("What is the total revenue by month?")
+    assert not is_lookup_question("Show me the pipeline")
@@ -0,0 +1,126 @@
+# test_rate_limiter.py
+
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import (
+    BACKGROUND, INTERACTIVE, MAX_RETRIES, LimitedStub, RateLimited,
+    TokenBucketScheduler, run,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _advance(bucket, clock, seconds):
+    clock.now += seconds
+    with bucket._cond:
+        bucket._cond.notify_all()
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    """A fresh process-wide scheduler named "test" for run()."""
+    monkeypatch.setitem(rate_limiter.BUDGETS, "test", (1000.0, 1.0))
+    monkeypatch.delitem(rate_limiter._schedulers, "test", raising=False)
+    yield "test"
+    rate_limiter._schedulers.pop("test", None)
+
+
+def test_interactive_is_served_before_queued_background():
+    clock  = FakeClock()
+    bucket = TokenBucketScheduler("t", rate=1.0, burst=1.0, reserve=0.0, clock=clock)
+    bucket.acquire()                      # drain the only token
+    order  = []
+
+    def caller(priority):
+        bucket.acquire(priority)
+        order.append(priority)
+
+    background  = threading.Thread(target=caller, args=(BACKGROUND,))
+    interactive = threading.Thread(target=caller, args=(INTERACTIVE,))
+    background.start()
+    _wait_until(lambda: bucket.metrics()["queued"] == 1)
+    interactive.start()
+    _wait_until(lambda: bucket.metrics()["queued"] == 2)
+
+    _advance(bucket, clock, 1.0)
+    _wait_until(lambda: len(order) == 1)
+    assert order == [INTERACTIVE]
+
+    _advance(bucket, clock, 1.0)
+    background.join(2.0)
+    interactive.join(2.0)
+    assert order == [INTERACTIVE, BACKGROUND]
+    assert bucket.metrics()["granted_background"] == 1
+
+
+def test_background_leaves_the_reserve():
+    bucket = TokenBucketScheduler("t", rate=1.0, burst=2.0, reserve=1.0, clock=FakeClock())
+    bucket.acquire(INTERACTIVE)           # one token left, which is the reserve
+    with pytest.raises(TimeoutError):
+        bucket.acquire(BACKGROUND, timeout=0)
+    assert bucket.acquire(INTERACTIVE, timeout=0) == 0.0
+    assert bucket.metrics()["queued"] == 0
+
+
+def test_throttle_pauses_until_retry_after():
+    clock  = FakeClock()
+    bucket = TokenBucketScheduler("t", rate=10.0, burst=5.0, clock=clock)
+    bucket.throttle(2.0)
+    _advance(bucket, clock, 1.9)
+    with pytest.raises(TimeoutError):
+        bucket.acquire(INTERACTIVE, timeout=0)
+    _advance(bucket, clock, 0.1)
+    assert bucket.acquire(INTERACTIVE, timeout=0) == 0.0
+    assert bucket.metrics()["throttled"] == 1
+
+
+def test_run_retries_after_429(endpoint):
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise RateLimited(0.02)
+        return "ok"
+
+    assert run(endpoint, flaky) == "ok"
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.02   # waited for Retry-After
+    assert rate_limiter.scheduler(endpoint).metrics()["throttled"] == 2
+
+
+def test_run_gives_up_after_max_retries(endpoint):
+    calls = []
+
+    def always_limited():
+        calls.append(1)
+        raise RateLimited(0.001)
+
+    with pytest.raises(RateLimited):
+        run(endpoint, always_limited)
+    assert len(calls) == MAX_RETRIES + 1
+
+
+def test_run_absorbs_429s_from_a_limited_upstream(endpoint):
+    stub = LimitedStub(rate=50.0, burst=1.0)
+    assert [run(endpoint, stub) for _ in range(5)] == ["ok"] * 5
+    assert stub.served == 5
+    assert stub.rejected >= 1
+    assert rate_limiter.scheduler(endpoint).metrics()["throttled"] == stub.rejected
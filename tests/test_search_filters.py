@@ -0,0 +1,90 @@
+# test_search_filters.py
+
+from datetime import date
+
+import pytest
+
+from search_filters import (
+    build_search_filter, mentioned_stages, mentioned_values, question_date_range,
+)
+
+KNOWN = {
+    "sales_rep":    ["Sarah Johnson", "Mike Chen", "Rachel Torres", "James Wilson"],
+    "product_line": ["Enterprise Suite", "Basic Package", "Premium Security", "Analytics Pro"],
+    "deal_stage":   ["Discovery", "Demo", "Technical Review", "Negotiation", "Expansion", "Closed"],
+}
+
+
+def test_rep_matches_on_full_name_and_surname():
+    assert build_search_filter("Deals handled by Rachel Torres", KNOWN) == \
+        {"@eq": {"sales_rep": "Rachel Torres"}}
+    assert build_search_filter("What did Torres promise?", KNOWN) == \
+        {"@eq": {"sales_rep": "Rachel Torres"}}
+
+
+def test_product_and_explicit_stage():
+    assert build_search_filter("Premium Security deals in the Negotiation stage", KNOWN) == {"@and": [
+        {"@eq": {"product_line": "Premium Security"}},
+        {"@eq": {"deal_stage": "Negotiation"}},
+    ]}
+
+
+def test_security_question_does_not_filter_on_product():
+    assert build_search_filter("What did clients say about security?", KNOWN) is None
+
+
+def test_security_review_question_does_not_filter():
+    assert build_search_filter("Which customers asked for a security review?", KNOWN) is None
+
+
+def test_package_pricing_question_does_not_filter_on_product():
+    assert build_search_filter("Summarize the package pricing discussions", KNOWN) is None
+
+
+def test_last_word_is_opt_in():
+    assert mentioned_values("any security concerns?", KNOWN["product_line"]) == []
+    assert mentioned_values("any security concerns?", KNOWN["product_line"], last_word=True) == \
+        ["Premium Security"]
+
+
+def test_selected_values_win_over_question():
+    assert build_search_filter("What did Torres promise?", KNOWN,
+                               selected={"sales_rep": ["Mike Chen", "James Wilson"]}) == \
+        {"@or": [{"@eq": {"sales_rep": "Mike Chen"}}, {"@eq": {"sales_rep": "James Wilson"}}]}
+
+
+@pytest.mark.parametrize("question", [
+    "Which customers asked for a demo?",
+    "What did customers say about expansion plans?",
+    "Summarize pricing negotiation points",
+    "Which prospects mentioned data discovery tools?",
+])
+def test_stage_words_in_plain_questions_do_not_filter(question):
+    assert build_search_filter(question, KNOWN) is None
+
+
+@pytest.mark.parametrize("question", [
+    "Which deals are in the Demo stage?",
+    "Deals at demo phase last quarter",
+    "List conversations with stage: Demo",
+    "Accounts where the stage is demo",
+])
+def test_explicit_stage_wording(question):
+    assert mentioned_stages(question, KNOWN["deal_stage"]) == ["Demo"]
+
+
+def test_date_range_from_question():
+    assert question_date_range("calls in March 2024") == (date(2024, 3, 1), date(2024, 3, 31))
+    assert question_date_range("conversations during 2024") == (date(2024, 1, 1), date(2024, 12, 31))
+    assert question_date_range("deals since 2024-06-01") == (date(2024, 6, 1), None)
+
+
+def test_topic_year_is_not_a_date_filter():
+    assert question_date_range("What did SecureBank say about their budget in 2025?") == (None, None)
+    assert question_date_range("Plans for renewal in March 2025?") == (None, None)
+
+
+def test_invalid_iso_date_is_ignored():
+    assert question_date_range("calls since 2024-13-01") == (None, None)
+    assert build_search_filter("calls since 2024-13-01 until 2024-06-30", KNOWN) == \
+        {"@lte": {"conversation_date": "2024-06-30 23:59:59"}}
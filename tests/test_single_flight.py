@@ -0,0 +1,97 @@
+# test_single_flight.py
+
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight, request_key
+
+FOLLOWERS = 7
+
+
+def _run_concurrently(group, key, fn, n):
+    """Start n callers of group.do(key, fn); return their results/errors."""
+    results, errors = [], []
+
+    def caller():
+        try:
+            results.append(group.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def _wait_for_followers(group, n, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while group.stats()["coalesced"] < n:
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_upstream_call():
+    group   = SingleFlight("test")
+    release = threading.Event()
+    calls   = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(2.0)
+        return {"items": [1, 2]}
+
+    threads, results, errors = _run_concurrently(group, "k", upstream, FOLLOWERS + 1)
+    _wait_for_followers(group, FOLLOWERS)
+    assert group.stats()["in_flight"] == 1
+    release.set()
+    for t in threads:
+        t.join(2.0)
+
+    assert len(calls) == 1
+    assert errors == []
+    assert results == [{"items": [1, 2]}] * (FOLLOWERS + 1)
+    # followers get copies, not the leader's object
+    assert len({id(r) for r in results}) == FOLLOWERS + 1
+    assert group.stats() == {
+        "calls": FOLLOWERS + 1, "upstream": 1, "coalesced": FOLLOWERS,
+        "errors": 0, "in_flight": 0,
+    }
+
+
+def test_leader_error_is_shared_with_followers():
+    group   = SingleFlight("test")
+    release = threading.Event()
+
+    def upstream():
+        release.wait(2.0)
+        raise RuntimeError("upstream down")
+
+    threads, results, errors = _run_concurrently(group, "k", upstream, FOLLOWERS + 1)
+    _wait_for_followers(group, FOLLOWERS)
+    release.set()
+    for t in threads:
+        t.join(2.0)
+
+    assert results == []
+    assert len(errors) == FOLLOWERS + 1
+    assert all(isinstance(e, RuntimeError) and str(e) == "upstream down" for e in errors)
+    stats = group.stats()
+    assert (stats["upstream"], stats["coalesced"], stats["errors"], stats["in_flight"]) == \
+        (1, FOLLOWERS, 1, 0)
+
+
+def test_sequential_calls_are_not_coalesced():
+    group = SingleFlight("test")
+    assert group.do("k", lambda: 1) == 1
+    with pytest.raises(ValueError):
+        group.do("k", lambda: int("x"))
+    assert group.do("k", lambda: 3) == 3
+    assert group.stats() == {"calls": 3, "upstream": 3, "coalesced": 0, "errors": 1, "in_flight": 0}
+
+
+def test_request_key_ignores_dict_order():
+    assert request_key({"a": 1, "b": 2}) == request_key({"b": 2, "a": 1})
+    assert request_key("x") != request_key("y")